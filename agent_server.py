@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import os
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from episode_trace import ACTIONS, OUTCOME_CODES
+from tournament import AGENTS
+from wampusworld import WumpusWorld, action_code
+
+# Every message is a HEADER followed by `length` payload bytes. Requests put
+# an opcode in the second field, responses a status. The session id is 0 in
+# a create request and the new session's id in its response.
+HEADER = struct.Struct("<IBI")
+# seed (-1 for none), grid size, pit probability, index into AGENT_KINDS
+CREATE = struct.Struct("<qHfB")
+# steps, x, y, heading (index into HEADINGS), percept bits (as in
+# episode_trace), flags, outcome code, last action code (NO_ACTION before
+# the first step)
+OBSERVATION = struct.Struct("<IHHBBBBB")
+# A step request carries one action code; AGENT_ACTION lets the agent decide
+STEP = struct.Struct("<B")
+
+OP_CREATE, OP_STEP, OP_OBSERVE, OP_CLOSE = range(4)
+# STATUS_SERVER_ERROR: the agent failed while deciding; the request was fine
+(STATUS_OK, STATUS_UNKNOWN_SESSION, STATUS_BUSY, STATUS_BAD_REQUEST, STATUS_FINISHED,
+ STATUS_SERVER_ERROR) = range(6)
+AGENT_ACTION = NO_ACTION = 0xFF
+FLAG_HAS_GOLD, FLAG_HAS_ARROW, FLAG_WUMPUS_ALIVE = 1, 2, 4
+AGENT_KINDS = tuple(sorted(AGENTS))
+MAX_PAYLOAD = 64
+
+
+class Session:
+    __slots__ = ("world", "agent", "steps", "last_action", "status", "last_used", "lock")
+
+    def __init__(self, world, agent):
+        self.world = world
+        self.agent = agent
+        self.steps = 0
+        self.last_action = None
+        self.status = "continue"
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def advance(self, action=None):
+        # One run_agent step; with no action the agent picks one
+        if action is None:
+            action = self.agent.decide_action()
+        self.steps += 1
+        self.last_action = action
+        self.agent.execute_action(action)
+        self.status = self.world.is_game_over()
+
+    def observation(self):
+        world = self.world
+        x, y = world.agent_pos
+        flags = ((FLAG_HAS_GOLD if world.has_gold else 0) |
+                 (FLAG_HAS_ARROW if world.has_arrow else 0) |
+                 (FLAG_WUMPUS_ALIVE if world.wumpus_alive else 0))
+        action = NO_ACTION if self.last_action is None else action_code(self.last_action)
+        return OBSERVATION.pack(self.steps, x, y, world.heading, world.percept_bits, flags,
+                                OUTCOME_CODES[self.status], action)
+
+
+def _new_game(seed, grid_size, pit_prob, kind):
+    # Runs on a pool thread: building a large world takes a while
+    world = WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=None if seed == -1 else seed)
+    return world, AGENTS[kind](world)
+
+
+def _advance_batch(sessions):
+    # Runs on a pool thread. Errors are returned per session so one bad
+    # game does not fail the rest of the batch.
+    errors = []
+    for session in sessions:
+        try:
+            session.advance()
+            errors.append(None)
+        except Exception as exc:
+            errors.append(exc)
+    return errors
+
+
+class AgentServer:
+    # Hosts many WumpusWorld + agent sessions in one process and serves
+    # them over a local socket.
+    #
+    # Agent decisions (the CPU-heavy part) are queued and run on a thread
+    # pool in batches of up to batch_size, one batch per worker at a time.
+    # The threads share the GIL, so decisions never run in parallel: the
+    # pool only keeps the event loop free to read and write sockets.
+    # The queue holds at most max_pending decisions; once it is full,
+    # connections stop being read until it drains, which pushes back on
+    # clients through the socket. Sessions idle for idle_timeout seconds are
+    # evicted, and when max_sessions is reached a create evicts the least
+    # recently used idle session or is refused with STATUS_BUSY. backlog
+    # (max_sessions by default) is the listen queue length, so bursts of
+    # new connections wait to be accepted instead of being reset. Worlds
+    # larger than max_grid_size are refused, and the rest are built on the
+    # pool too.
+    def __init__(self, max_sessions=10000, idle_timeout=300.0, batch_size=32, workers=None,
+                 max_pending=1024, backlog=None, max_grid_size=256):
+        self.max_sessions = max_sessions
+        self.backlog = backlog or max_sessions
+        self.max_grid_size = max_grid_size
+        self.idle_timeout = idle_timeout
+        self.batch_size = batch_size
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self.sessions = OrderedDict()
+        self.next_session_id = 1
+        # Creates still building their world; they count against max_sessions
+        self.creating = 0
+        self.evictions = 0
+        self.executor = None
+        self.pending = None
+        self.server = None
+        self.tasks = []
+
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        # Listens on a Unix socket at path, or on host:port over TCP
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="wumpus-agent")
+        self.pending = asyncio.Queue(self.max_pending)
+        self.tasks = [asyncio.create_task(self._batcher()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._sweeper()))
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path,
+                                                          backlog=self.backlog)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port,
+                                                     backlog=self.backlog)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        # Requests on one connection are answered in order
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                length, opcode, session_id = HEADER.unpack(header)
+                if length > MAX_PAYLOAD:
+                    writer.write(HEADER.pack(0, STATUS_BAD_REQUEST, session_id))
+                    break
+                payload = await reader.readexactly(length)
+                status, session_id, body = await self.dispatch(opcode, session_id, payload)
+                writer.write(HEADER.pack(len(body), status, session_id) + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, opcode, session_id, payload):
+        if opcode == OP_CREATE:
+            if len(payload) != CREATE.size:
+                return STATUS_BAD_REQUEST, 0, b""
+            return await self.create(*CREATE.unpack(payload))
+        session = self.sessions.get(session_id)
+        if session is None:
+            return STATUS_UNKNOWN_SESSION, session_id, b""
+        self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        # Like step, both wait for a decision in progress on a pool thread,
+        # so they never see a half-applied step
+        if opcode == OP_OBSERVE:
+            async with session.lock:
+                return STATUS_OK, session_id, session.observation()
+        if opcode == OP_CLOSE:
+            async with session.lock:
+                if self.sessions.get(session_id) is session:
+                    del self.sessions[session_id]
+            return STATUS_OK, session_id, b""
+        if opcode == OP_STEP and len(payload) == STEP.size:
+            code, = STEP.unpack(payload)
+            if code != AGENT_ACTION and code >= len(ACTIONS):
+                return STATUS_BAD_REQUEST, session_id, b""
+            return await self.step(session_id, session, code)
+        return STATUS_BAD_REQUEST, session_id, b""
+
+    async def create(self, seed, grid_size, pit_prob, kind):
+        if (kind >= len(AGENT_KINDS) or not 2 <= grid_size <= self.max_grid_size or
+                not 0.0 <= pit_prob <= 1.0):
+            return STATUS_BAD_REQUEST, 0, b""
+        if (len(self.sessions) + self.creating >= self.max_sessions and
+                not self.evict_oldest()):
+            return STATUS_BUSY, 0, b""
+        self.creating += 1
+        try:
+            world, agent = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _new_game, seed, grid_size, pit_prob, AGENT_KINDS[kind])
+        finally:
+            self.creating -= 1
+        session = Session(world, agent)
+        session_id = self.next_session_id
+        self.next_session_id += 1
+        self.sessions[session_id] = session
+        return STATUS_OK, session_id, session.observation()
+
+    async def step(self, session_id, session, code):
+        async with session.lock:
+            if session.status != "continue":
+                return STATUS_FINISHED, session_id, session.observation()
+            if code == AGENT_ACTION:
+                future = asyncio.get_running_loop().create_future()
+                # Blocks while the queue is full: this is the backpressure
+                await self.pending.put((session, future))
+                error = await future
+                if error is not None:
+                    return STATUS_SERVER_ERROR, session_id, b""
+            else:
+                # A given action is cheap enough to apply inline
+                session.advance(code)
+            session.last_used = time.monotonic()
+            return STATUS_OK, session_id, session.observation()
+
+    def evict_oldest(self):
+        for session_id, session in self.sessions.items():
+            if not session.lock.locked():
+                del self.sessions[session_id]
+                self.evictions += 1
+                return True
+        return False
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            while len(batch) < self.batch_size and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+            errors = await loop.run_in_executor(self.executor, _advance_batch,
+                                                [session for session, _ in batch])
+            for (_, future), error in zip(batch, errors):
+                if not future.done():
+                    future.set_result(error)
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.01))
+            deadline = time.monotonic() - self.idle_timeout
+            # Sessions are kept in least recently used order
+            for session_id, session in list(self.sessions.items()):
+                if session.last_used > deadline:
+                    break
+                if not session.lock.locked():
+                    del self.sessions[session_id]
+                    self.evictions += 1
+
+
+class AgentClient:
+    # Minimal client for the protocol; one request in flight at a time
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, path=None, host="127.0.0.1", port=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, opcode, session_id=0, payload=b""):
+        # Returns (status, session id, payload)
+        self.writer.write(HEADER.pack(len(payload), opcode, session_id) + payload)
+        await self.writer.drain()
+        length, status, session_id = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+        return status, session_id, await self.reader.readexactly(length)
+
+    async def create(self, seed=None, grid_size=4, pit_prob=0.2, agent="logic"):
+        payload = CREATE.pack(-1 if seed is None else seed, grid_size, pit_prob,
+                              AGENT_KINDS.index(agent))
+        return await self.request(OP_CREATE, 0, payload)
+
+    async def step(self, session_id, action=None):
+        code = AGENT_ACTION if action is None else action_code(action)
+        return await self.request(OP_STEP, session_id, STEP.pack(code))
+
+    async def observe(self, session_id):
+        return await self.request(OP_OBSERVE, session_id)
+
+    async def close_session(self, session_id):
+        return await self.request(OP_CLOSE, session_id)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(args):
+    server = AgentServer(args.max_sessions, args.idle_timeout, args.batch_size, args.workers,
+                         args.max_pending, args.backlog, args.max_grid_size)
+    listener = await server.start(args.socket, args.host, args.port)
+    where = args.socket or ", ".join(str(sock.getsockname()) for sock in listener.sockets)
+    print(f"Serving Wumpus sessions on {where}")
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many Wumpus World agent sessions from one process")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--idle-timeout", type=float, default=300.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=1024)
+    parser.add_argument("--backlog", type=int, default=None,
+                        help="listen queue length (default: --max-sessions)")
+    parser.add_argument("--max-grid-size", type=int, default=256,
+                        help="refuse to create larger worlds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+from tournament import AGENTS
+from wampusworld import EXIT, WumpusWorld
+
+GRID_SIZES = (4, 8, 16, 32, 64, 128, 256, 512, 1000)
+LAYOUTS = ("seeded", "open")
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_generation(grid_size, pit_prob, seeds):
+    times = []
+    for seed in seeds:
+        start = time.perf_counter()
+        WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=seed)
+        times.append(time.perf_counter() - start)
+    return sum(times) / len(times)
+
+
+def open_layout(grid_size):
+    # No pits, Wumpus or gold: nothing ends an episode before max_steps.
+    # A fixed-length baseline next to the seeded runs.
+    return [[{"pit": False, "wumpus": False, "gold": False} for _ in range(grid_size)]
+            for _ in range(grid_size)]
+
+
+def make_world(layout, grid_size, pit_prob, seed):
+    if layout == "open":
+        return WumpusWorld(world=open_layout(grid_size))
+    return WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=seed)
+
+
+def play_timed(world, agent_cls, max_steps):
+    agent = agent_cls(world)
+
+    # decide_action calls update_knowledge itself, so time it through a
+    # wrapper on the instance
+    update_times = []
+    update_knowledge = agent.update_knowledge
+
+    def timed_update():
+        start = time.perf_counter()
+        update_knowledge()
+        update_times.append(time.perf_counter() - start)
+
+    agent.update_knowledge = timed_update
+
+    decide_times = []
+    for _ in range(max_steps):
+        start = time.perf_counter()
+        action = agent.decide_action()
+        decide_times.append(time.perf_counter() - start)
+        if action == EXIT:
+            break
+        agent.execute_action(action)
+        if world.is_game_over() != "continue":
+            break
+    return decide_times, update_times, len(agent.visited)
+
+
+def peak_memory(grid_size, pit_prob, seed, agent_cls, max_steps, layout="seeded"):
+    # Separate run: tracemalloc slows everything down too much to time under it
+    tracemalloc.start()
+    try:
+        WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=seed)
+        generation_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        world = make_world(layout, grid_size, pit_prob, seed)
+        # Waiting once an open layout is explored would otherwise stop the
+        # episode as stuck
+        world.run_agent(max_steps=max_steps, verbose=False, agent_factory=agent_cls,
+                        detect_stalls=layout != "open")
+        episode_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return generation_peak, episode_peak
+
+
+def run_benchmarks(grid_sizes=GRID_SIZES, agents=("logic", "bitboard"), seeds=(0, 1, 2),
+                   pit_prob=0.2, max_steps=200, memory=True, layouts=LAYOUTS):
+    # One row per grid size, agent and layout. "seeded" plays the seeded
+    # worlds with pits and a Wumpus, so episodes end when the agent wins,
+    # dies or gets stuck, and the sample count says how much each row rests
+    # on. "open" is the same for every seed and runs the full max_steps.
+    results = []
+    for grid_size in grid_sizes:
+        generation = bench_generation(grid_size, pit_prob, seeds)
+        for name in agents:
+            agent_cls = AGENTS[name]
+            for layout in layouts:
+                decide_times, update_times, explored = [], [], 0
+                for seed in seeds:
+                    world = make_world(layout, grid_size, pit_prob, seed)
+                    decide, update, visited = play_timed(world, agent_cls, max_steps)
+                    decide_times.extend(decide)
+                    update_times.extend(update)
+                    explored += visited
+
+                row = {
+                    "grid_size": grid_size,
+                    "agent": name,
+                    "layout": layout,
+                    "generation_s": generation,
+                    "episodes": len(seeds),
+                    # update_knowledge runs once in every decision
+                    "samples": len(decide_times),
+                    "explored_cells": explored / len(seeds),
+                    "decide_mean_s": sum(decide_times) / len(decide_times),
+                    "decide_p99_s": percentile(decide_times, 0.99),
+                    "update_mean_s": sum(update_times) / len(update_times),
+                    "update_p99_s": percentile(update_times, 0.99),
+                }
+                if memory:
+                    row["generation_peak_bytes"], row["episode_peak_bytes"] = peak_memory(
+                        grid_size, pit_prob, seeds[0], agent_cls, max_steps, layout)
+                results.append(row)
+    return results
+
+
+def format_row(row):
+    line = (f"{row['grid_size']:>5} {row['agent']:>9} {row['layout']:>6} "
+            f"gen {row['generation_s'] * 1e3:9.2f}ms  "
+            f"samples {row['samples']:>6} "
+            f"cells {row['explored_cells']:>7.1f}  "
+            f"decide mean {row['decide_mean_s'] * 1e6:9.1f}us p99 {row['decide_p99_s'] * 1e6:9.1f}us  "
+            f"update mean {row['update_mean_s'] * 1e6:8.1f}us p99 {row['update_p99_s'] * 1e6:8.1f}us")
+    if "episode_peak_bytes" in row:
+        line += (f"  peak gen {row['generation_peak_bytes'] / 2**20:7.1f}MiB "
+                 f"episode {row['episode_peak_bytes'] / 2**20:7.1f}MiB")
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how the world and agent scale with grid size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(GRID_SIZES))
+    parser.add_argument("--agents", nargs="+", choices=sorted(AGENTS), default=["logic", "bitboard"])
+    parser.add_argument("--seeds", type=int, default=3, help="worlds per grid size")
+    parser.add_argument("--pit-prob", type=float, default=0.2)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS),
+                        help="seeded worlds, and/or the open baseline without hazards")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for grid_size in args.sizes:
+        rows = run_benchmarks([grid_size], args.agents, tuple(range(args.seeds)),
+                              args.pit_prob, args.max_steps, not args.no_memory, args.layouts)
+        results.extend(rows)
+        if not args.json:
+            for row in rows:
+                print(format_row(row), flush=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from collections.abc import MutableSet
+from functools import lru_cache
+
+from wampusworld import (BREEZE_BIT, GLITTER_BIT, KNOWLEDGE_SETS, SCREAM_BIT, STENCH_BIT,
+                         LogicAgent, _knowledge_versions, grid_topology)
+
+
+# Each precomputed mask is grid_size ** 2 bits wide, so the table grows with
+# the fourth power of the grid size. Above this size masks are built per call.
+PRECOMPUTE_LIMIT = 64
+
+
+def neighbour_mask(grid_size, index):
+    # Bit (x * grid_size + y) stands for cell (x, y)
+    mask = 0
+    for neighbour in grid_topology(grid_size).neighbour_cells(index):
+        mask |= 1 << neighbour
+    return mask
+
+
+@lru_cache(maxsize=None)
+def neighbour_masks(grid_size):
+    return tuple(neighbour_mask(grid_size, index) for index in range(grid_size * grid_size))
+
+
+class CellMask(MutableSet):
+    # A set of (x, y) cells stored as one integer bitmask. It supports the
+    # set operations LogicAgent uses, so it can stand in for a plain set.
+    # Like KnowledgeSet it takes a new version whenever a cell is added or
+    # removed; code writing bits directly calls touch() afterwards.
+    __slots__ = ("grid_size", "bits", "version")
+
+    def __init__(self, grid_size, cells=()):
+        self.grid_size = grid_size
+        self.bits = 0
+        self.version = 0
+        for cell in cells:
+            self.add(cell)
+        self.version = next(_knowledge_versions)
+
+    def __contains__(self, cell):
+        x, y = cell
+        n = self.grid_size
+        return 0 <= x < n and 0 <= y < n and (self.bits >> (x * n + y)) & 1 == 1
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield divmod(low.bit_length() - 1, self.grid_size)
+            bits ^= low
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __repr__(self):
+        return f"CellMask({sorted(self)})"
+
+    def touch(self, previous_bits):
+        if self.bits != previous_bits:
+            self.version = next(_knowledge_versions)
+
+    def add(self, cell):
+        x, y = cell
+        bit = 1 << (x * self.grid_size + y)
+        if not self.bits & bit:
+            self.bits |= bit
+            self.version = next(_knowledge_versions)
+
+    def discard(self, cell):
+        x, y = cell
+        bit = 1 << (x * self.grid_size + y)
+        if self.bits & bit:
+            self.bits ^= bit
+            self.version = next(_knowledge_versions)
+
+    def clear(self):
+        if self.bits:
+            self.bits = 0
+            self.version = next(_knowledge_versions)
+
+    def pop(self):
+        if not self.bits:
+            raise KeyError("pop from an empty CellMask")
+        low = self.bits & -self.bits
+        self.bits ^= low
+        self.version = next(_knowledge_versions)
+        return divmod(low.bit_length() - 1, self.grid_size)
+
+    def copy(self):
+        other = CellMask(self.grid_size)
+        other.bits = self.bits
+        other.version = self.version
+        return other
+
+
+class BitboardAgent(LogicAgent):
+    # LogicAgent with every knowledge set stored as a CellMask; inference
+    # runs as a handful of bitwise operations per step
+    def __init__(self, world, **kwargs):
+        super().__init__(world, **kwargs)
+        if world.grid_size <= PRECOMPUTE_LIMIT:
+            self.neighbours = neighbour_masks(world.grid_size)
+        else:
+            self.neighbours = None
+        for name in KNOWLEDGE_SETS:
+            setattr(self, name, CellMask(world.grid_size, getattr(self, name)))
+
+    def update_knowledge(self):
+        if self.inference is not None:
+            return super().update_knowledge()
+        x, y = self.world.agent_pos
+        percepts = self.world.percept_bits
+        index = x * self.world.grid_size + y
+        cell = 1 << index
+        if self.neighbours is not None:
+            neighbours = self.neighbours[index]
+        else:
+            neighbours = neighbour_mask(self.world.grid_size, index)
+        safe = self.safe
+        unsafe = self.unsafe
+        frontier = self.frontier
+        # Plans key on the versions of these three
+        previous = (safe.bits, unsafe.bits, frontier.bits)
+
+        # Current cell is safe (since we're in it)
+        safe.bits |= cell
+        self.visited.bits |= cell
+
+        if percepts & GLITTER_BIT:
+            self.gold_position = (x, y)
+
+        if percepts & SCREAM_BIT:
+            self.wumpus_positions.bits = 0
+            self.possible_wumpus.bits = 0
+
+        if percepts & STENCH_BIT:
+            self.stench_positions.bits |= cell
+            self.possible_wumpus.bits |= neighbours & ~self.visited.bits & ~safe.bits
+        else:
+            self.possible_wumpus.bits &= ~neighbours
+            safe.bits |= neighbours
+
+        if percepts & BREEZE_BIT:
+            self.breeze_positions.bits |= cell
+            self.possible_pits.bits |= neighbours & ~self.visited.bits & ~safe.bits
+        else:
+            self.possible_pits.bits &= ~neighbours
+            safe.bits |= neighbours
+
+        # Deduce Wumpus position if possible
+        possible_wumpus = self.possible_wumpus.bits
+        if possible_wumpus and possible_wumpus & (possible_wumpus - 1) == 0:
+            self.wumpus_positions.bits |= possible_wumpus
+            self.unsafe.bits |= possible_wumpus
+            self.possible_wumpus.bits = possible_wumpus = 0
+
+        # Mark possible pits as unsafe if they can't be anything else
+        self.unsafe.bits |= self.possible_pits.bits & ~possible_wumpus
+
+        self.frontier.bits = safe.bits & ~self.visited.bits
+
+        for mask, bits in zip((safe, unsafe, frontier), previous):
+            mask.touch(bits)
@@ -0,0 +1,190 @@
+import argparse
+import os
+import struct
+from collections import Counter
+
+from episode_trace import RecordReader, decode_layout, encode_layout
+from wampusworld import LogicAgent, WumpusWorld, grid_topology
+
+# File layout: FILE_MAGIC, then one record per world: a RECORD header
+# (seed, pit probability, grid size, label) followed by the layout, one
+# byte per cell in the episode_trace encoding.
+FILE_MAGIC = b"WCORPUS1"
+RECORD = struct.Struct("<qfHBx")
+
+# solvable: the reference LogicAgent wins it. hard: the gold can be reached
+# without entering a pit (the Wumpus can always be shot from the cell before
+# it), but the reference agent does not win. unsolvable: every route to the
+# gold crosses a pit.
+LABELS = ("solvable", "hard", "unsolvable")
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+# The standard suite: SUITE_PER_LABEL worlds of every label at every size
+SUITE_SIZES = (4, 8, 16)
+SUITE_PER_LABEL = 200
+SUITE_PIT_PROB = 0.2
+# Step budget of the reference agent when labelling; generous for the suite
+# sizes, and only timeouts are affected by it
+LABEL_MAX_STEPS = 2000
+
+
+def gold_reachable(grid):
+    n = len(grid)
+    topology = grid_topology(n)
+    seen = {(0, 0)}
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack.pop()
+        if grid[x][y]["gold"]:
+            return True
+        for cell in topology.neighbours(x, y):
+            if cell not in seen and not grid[cell[0]][cell[1]]["pit"]:
+                seen.add(cell)
+                stack.append(cell)
+    return False
+
+
+def label_world(world, max_steps=LABEL_MAX_STEPS, agent_factory=LogicAgent):
+    # The world is played by the reference agent, so pass a fresh one
+    if not gold_reachable(world.world):
+        return "unsolvable"
+    status = world.run_agent(max_steps=max_steps, verbose=False, agent_factory=agent_factory)
+    return "solvable" if status == "win" else "hard"
+
+
+class CorpusWriter:
+    # Appends worlds to a corpus file, skipping layouts already written
+    # through this writer (or present in the file when it was opened)
+    def __init__(self, path):
+        self.seen = set()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with CorpusReader(path) as reader:
+                self.seen.update(bytes(entry.layout) for entry in reader)
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+        self.labels = Counter()
+
+    def add(self, world, label):
+        # Returns False for a duplicate layout
+        layout = bytes(encode_layout(world))
+        if layout in self.seen:
+            return False
+        self.seen.add(layout)
+        seed = -1 if world.seed is None else world.seed
+        self.file.write(RECORD.pack(seed, world.pit_prob, world.grid_size, LABEL_CODES[label]) + layout)
+        self.labels[label] += 1
+        return True
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CorpusEntry:
+    __slots__ = ("seed", "pit_prob", "grid_size", "label", "layout")
+
+    def __init__(self, buffer, offset):
+        seed, pit_prob, grid_size, label = RECORD.unpack_from(buffer, offset)
+        self.seed = None if seed == -1 else seed
+        # Stored as a float32; round off the noise
+        self.pit_prob = round(pit_prob, 6)
+        self.grid_size = grid_size
+        self.label = LABELS[label]
+        # A view into the mapped file
+        start = offset + RECORD.size
+        self.layout = buffer[start:start + grid_size * grid_size]
+
+    def world(self):
+        world = WumpusWorld(world=decode_layout(self.layout, self.grid_size), pit_prob=self.pit_prob)
+        world.seed = self.seed
+        return world
+
+
+class CorpusReader(RecordReader):
+    # Memory-maps a corpus file and indexes its records
+    magic = FILE_MAGIC
+    kind = "a world corpus"
+    header_size = RECORD.size
+    record_class = CorpusEntry
+
+    def record_size(self, buffer, offset):
+        grid_size = RECORD.unpack_from(buffer, offset)[2]
+        return RECORD.size + grid_size * grid_size
+
+    def select(self, label=None, grid_size=None):
+        # Indices of the entries matching the filters
+        return [index for index, entry in enumerate(self)
+                if (label is None or entry.label == label) and
+                (grid_size is None or entry.grid_size == grid_size)]
+
+    def worlds(self, label=None, grid_size=None):
+        # Fresh WumpusWorld objects, ready for run_agent
+        for index in self.select(label, grid_size):
+            yield self[index].world()
+
+
+def generate_corpus(writer, grid_size, per_label, pit_prob=SUITE_PIT_PROB, base_seed=0,
+                    labels=LABELS, max_worlds=None, max_steps=LABEL_MAX_STEPS):
+    # Draws seeded worlds from base_seed on until every label in labels has
+    # per_label new worlds, or max_worlds seeds (default 1000 per world
+    # wanted) have been tried. Returns the labels counted for this size.
+    wanted = {label: per_label for label in labels}
+    if max_worlds is None:
+        max_worlds = 1000 * per_label * len(labels)
+    found = Counter()
+    for seed in range(base_seed, base_seed + max_worlds):
+        if all(found[label] >= count for label, count in wanted.items()):
+            break
+        world = WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=seed)
+        # Label a clone: the reference run changes the world
+        label = label_world(world.clone(), max_steps)
+        if label in wanted and found[label] < wanted[label] and writer.add(world, label):
+            found[label] += 1
+    return found
+
+
+def build_suite(path, sizes=SUITE_SIZES, per_label=SUITE_PER_LABEL, pit_prob=SUITE_PIT_PROB,
+                base_seed=0):
+    # Seeds depend only on base_seed and the size, so rebuilding the suite
+    # always gives the same file
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    with CorpusWriter(path) as writer:
+        for grid_size in sizes:
+            found = generate_corpus(writer, grid_size, per_label, pit_prob,
+                                    base_seed + grid_size * 10 ** 6)
+            for label in LABELS:
+                if found[label] < per_label:
+                    print(f"warning: only {found[label]} {label} worlds of size {grid_size}")
+        return writer.labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect world corpora")
+    commands = parser.add_subparsers(dest="command", required=True)
+    suite = commands.add_parser("suite", help="build the standard benchmark suite")
+    suite.add_argument("path")
+    suite.add_argument("--sizes", type=int, nargs="+", default=list(SUITE_SIZES))
+    suite.add_argument("--per-label", type=int, default=SUITE_PER_LABEL)
+    suite.add_argument("--pit-prob", type=float, default=SUITE_PIT_PROB)
+    suite.add_argument("--seed", type=int, default=0)
+    info = commands.add_parser("info", help="count the worlds in a corpus by size and label")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        build_suite(args.path, args.sizes, args.per_label, args.pit_prob, args.seed)
+    with CorpusReader(args.path) as reader:
+        counts = Counter((entry.grid_size, entry.label) for entry in reader)
+    for (grid_size, label), count in sorted(counts.items()):
+        print(f"{grid_size:>5} {label:>10}: {count}")
+
+
+if __name__ == "__main__":
+    main()
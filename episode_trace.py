@@ -0,0 +1,207 @@
+import mmap
+import os
+import struct
+
+from wampusworld import (ACTION_NAMES, PERCEPT_NAMES, WumpusWorld, action_code,
+                         percept_bits, percept_dict)
+
+# File layout: FILE_MAGIC, then one record per episode. A record is an
+# EPISODE_HEADER (seed, steps, grid size, outcome) followed by three
+# columns: the layout (one byte per cell, row-major), one action code per
+# step and one percept byte per step, taken after the action.
+FILE_MAGIC = b"WTRACE1\n"
+EPISODE_HEADER = struct.Struct("<qIHBx")
+
+# Action codes and percept bits are the world's own (Action, Percept)
+ACTIONS = ACTION_NAMES
+PERCEPTS = PERCEPT_NAMES
+OUTCOMES = ("continue", "win", "lose", "stuck")
+OUTCOME_CODES = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+
+# Same bits as worldgen's PIT/WUMPUS/GOLD
+CELL_BITS = (("pit", 1), ("wumpus", 2), ("gold", 4))
+
+
+def encode_percepts(percepts):
+    # Percept bits pass through; a percept dict is packed
+    return percepts if isinstance(percepts, int) else percept_bits(percepts)
+
+
+def decode_percepts(bits):
+    return percept_dict(bits)
+
+
+def encode_layout(world):
+    layout = bytearray()
+    for row in world.world:
+        for cell in row:
+            code = 0
+            for name, bit in CELL_BITS:
+                if cell[name]:
+                    code |= bit
+            layout.append(code)
+    return layout
+
+
+def decode_layout(layout, grid_size):
+    return [[{name: bool(layout[i * grid_size + j] & bit) for name, bit in CELL_BITS}
+             for j in range(grid_size)]
+            for i in range(grid_size)]
+
+
+class TraceWriter:
+    # Appends episodes to a trace file. Pass it as run_agent's recorder; each
+    # episode is buffered in memory and written with a single write() when it
+    # ends.
+    def __init__(self, path):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_MAGIC)
+        self.seed = None
+        self.grid_size = 0
+        self.layout = None
+        self.actions = bytearray()
+        self.percepts = bytearray()
+
+    def begin(self, world):
+        self.seed = world.seed
+        self.grid_size = world.grid_size
+        self.layout = encode_layout(world)
+        self.actions = bytearray()
+        self.percepts = bytearray()
+
+    def step(self, action, percepts):
+        self.actions.append(action_code(action))
+        self.percepts.append(encode_percepts(percepts))
+
+    def end(self, outcome):
+        header = EPISODE_HEADER.pack(-1 if self.seed is None else self.seed, len(self.actions),
+                                     self.grid_size, OUTCOME_CODES[outcome])
+        self.file.write(header + self.layout + self.actions + self.percepts)
+        self.layout = None
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Episode:
+    def __init__(self, buffer, offset):
+        seed, steps, grid_size, outcome = EPISODE_HEADER.unpack_from(buffer, offset)
+        self.seed = None if seed == -1 else seed
+        self.steps = steps
+        self.grid_size = grid_size
+        self.outcome = OUTCOMES[outcome]
+        # Views into the mapped file; nothing is copied until read
+        start = offset + EPISODE_HEADER.size
+        cells = grid_size * grid_size
+        self.layout = buffer[start:start + cells]
+        self.action_codes = buffer[start + cells:start + cells + steps]
+        self.percept_codes = buffer[start + cells + steps:start + cells + 2 * steps]
+
+    @staticmethod
+    def record_size(buffer, offset):
+        _, steps, grid_size, _ = EPISODE_HEADER.unpack_from(buffer, offset)
+        return EPISODE_HEADER.size + grid_size * grid_size + 2 * steps
+
+    @property
+    def actions(self):
+        return [ACTIONS[code] for code in self.action_codes]
+
+    def percepts(self, step):
+        # Percepts after the given (0-based) step
+        return decode_percepts(self.percept_codes[step])
+
+    def world_at(self, step):
+        # The world as it was after the first `step` actions; world_at(0) is
+        # the start of the episode
+        world = WumpusWorld(world=decode_layout(self.layout, self.grid_size))
+        world.seed = self.seed
+        for code in self.action_codes[:step]:
+            world.execute_action(code)
+        return world
+
+
+class RecordReader:
+    # Memory-maps a file made of a magic string and a run of records, and
+    # indexes the records. Subclasses set the class attributes and
+    # record_size; record_class(buffer, offset) wraps one record.
+    magic = None
+    kind = None
+    header_size = None
+    record_class = None
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mmap = self.buffer = None
+        try:
+            size = os.fstat(self.file.fileno()).st_size
+            if size == 0:
+                raise ValueError(f"{path} is empty")
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = memoryview(self.mmap)
+            if self.buffer[:len(self.magic)] != self.magic:
+                raise ValueError(f"{path} is not {self.kind}")
+        except Exception:
+            self.close()
+            raise
+
+        self.offsets = []
+        offset = len(self.magic)
+        # A record cut short by an interrupted write is ignored
+        while offset + self.header_size <= size:
+            end = offset + self.record_size(self.buffer, offset)
+            if end > size:
+                break
+            self.offsets.append(offset)
+            offset = end
+
+    def record_size(self, buffer, offset):
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return self.record_class(self.buffer, self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield self.record_class(self.buffer, offset)
+
+    def close(self):
+        self.file.close()
+        try:
+            if self.buffer is not None:
+                self.buffer.release()
+            if self.mmap is not None:
+                self.mmap.close()
+        except BufferError:
+            # Records still hold views into the map; it is unmapped once
+            # they are garbage collected
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TraceReader(RecordReader):
+    # Memory-maps a trace file and indexes the episodes in it
+    magic = FILE_MAGIC
+    kind = "an episode trace"
+    header_size = EPISODE_HEADER.size
+    record_class = Episode
+
+    def record_size(self, buffer, offset):
+        return Episode.record_size(buffer, offset)
+
+    def world_at(self, index, step):
+        return self[index].world_at(step)
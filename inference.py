@@ -0,0 +1,472 @@
+from wampusworld import BREEZE_BIT, GLITTER_BIT, SCREAM_BIT, STENCH_BIT, grid_topology
+
+# Literals are non-zero ints: v means variable v is true, -v that it is false
+
+
+class DPLLSolver:
+    # Incremental CDCL solver: two watched literals per clause, first-UIP
+    # clause learning and non-chronological backjumping. Learned clauses and
+    # level-0 facts are kept between calls to solve(), which takes the
+    # literals to assume for that call only.
+    def __init__(self):
+        self.num_vars = 0
+        # Clauses are referenced by index; simplify() sets the slots of
+        # clauses satisfied for good to None
+        self.clauses = []
+        self.num_learned = 0
+        # watches[2 * v] holds the clauses watching v, watches[2 * v + 1]
+        # the clauses watching -v
+        self.watches = [[], []]
+        # occurrences[v] holds every live clause mentioning v
+        self.occurrences = [[]]
+        self.values = [0]  # 1 true, -1 false, 0 unassigned
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        # Only variables that occur in a clause of two or more literals are
+        # ever branched on; the rest are fixed at level 0 or unconstrained
+        self.decision_vars = []
+        self.is_decision_var = [False]
+        self.model = None
+        self.trail = []
+        self.trail_limits = []
+        self.queue_head = 0
+        self.simplified_trail = 0
+        self.ok = True
+
+    def new_var(self):
+        self.num_vars += 1
+        self.watches.extend(([], []))
+        self.occurrences.append([])
+        self.values.append(0)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.is_decision_var.append(False)
+        return self.num_vars
+
+    def value(self, lit):
+        value = self.values[abs(lit)]
+        return value if lit > 0 else -value
+
+    def _watch_index(self, lit):
+        return 2 * lit if lit > 0 else -2 * lit + 1
+
+    def add_clause(self, lits):
+        # Only called between solves, so the solver is at level 0 and any
+        # assigned literal is a permanent fact
+        if not self.ok:
+            return False
+        clause = []
+        for lit in lits:
+            value = self.value(lit)
+            if value == 1 or -lit in clause:
+                return True  # Already satisfied or a tautology
+            if value == 0 and lit not in clause:
+                clause.append(lit)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._assign(clause[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self._attach(clause)
+        return self.ok
+
+    def _attach(self, clause):
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[self._watch_index(clause[0])].append(index)
+        self.watches[self._watch_index(clause[1])].append(index)
+        for lit in clause:
+            var = abs(lit)
+            self.occurrences[var].append(index)
+            if not self.is_decision_var[var]:
+                self.is_decision_var[var] = True
+                self.decision_vars.append(var)
+        return index
+
+    def simplify(self):
+        # Between solves: drop clauses satisfied at level 0 and strip false
+        # literals from the rest, so that search and decision-variable
+        # scans only see the live part of the formula. Only clauses
+        # mentioning a variable fixed since the last call are visited.
+        # After propagation both watched literals of a live clause are
+        # unassigned, so only the tail needs stripping.
+        if not self.ok or self.simplified_trail == len(self.trail):
+            return
+        dirty = set()
+        for lit in self.trail[self.simplified_trail:]:
+            dirty.update(self.occurrences[abs(lit)])
+        self.simplified_trail = len(self.trail)
+
+        for index in dirty:
+            clause = self.clauses[index]
+            if clause is None:
+                continue
+            if any(self.value(lit) == 1 for lit in clause):
+                self.clauses[index] = None
+                self.watches[self._watch_index(clause[0])].remove(index)
+                self.watches[self._watch_index(clause[1])].remove(index)
+                removed = clause
+            else:
+                removed = [lit for lit in clause[2:] if self.value(lit) == -1]
+                clause[2:] = [lit for lit in clause[2:] if self.value(lit) != -1]
+            for lit in removed:
+                self.occurrences[abs(lit)].remove(index)
+
+        decision_vars = []
+        for var in self.decision_vars:
+            if self.occurrences[var]:
+                decision_vars.append(var)
+            else:
+                self.is_decision_var[var] = False
+        self.decision_vars = decision_vars
+
+    def _assign(self, lit, reason):
+        var = abs(lit)
+        self.values[var] = 1 if lit > 0 else -1
+        self.levels[var] = len(self.trail_limits)
+        self.reasons[var] = reason
+        self.trail.append(lit)
+
+    def _propagate(self):
+        # Returns the index of a conflicting clause, or None
+        values = self.values
+        while self.queue_head < len(self.trail):
+            false_lit = -self.trail[self.queue_head]
+            self.queue_head += 1
+            watch_index = self._watch_index(false_lit)
+            watchers = self.watches[watch_index]
+            kept = []
+            for position, index in enumerate(watchers):
+                clause = self.clauses[index]
+                # Keep the falsified watch in slot 1
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                first_value = values[abs(first)] if first > 0 else -values[abs(first)]
+                if first_value == 1:
+                    kept.append(index)
+                    continue
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    if (values[abs(lit)] if lit > 0 else -values[abs(lit)]) != -1:
+                        clause[1], clause[k] = lit, false_lit
+                        self.watches[self._watch_index(lit)].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if first_value == -1:
+                        kept.extend(watchers[position + 1:])
+                        self.watches[watch_index] = kept
+                        self.queue_head = len(self.trail)
+                        return index
+                    self._assign(first, index)
+            self.watches[watch_index] = kept
+        return None
+
+    def _analyze(self, conflict):
+        # First-UIP learning; returns the learned clause (asserting literal
+        # first, highest remaining level second) and the level to backjump to
+        level = len(self.trail_limits)
+        seen = set()
+        learned = [0]
+        pending = 0
+        lit = None
+        position = len(self.trail) - 1
+        clause = self.clauses[conflict]
+        while True:
+            for other in (clause if lit is None else clause[1:]):
+                var = abs(other)
+                if var in seen or self.levels[var] == 0:
+                    continue
+                seen.add(var)
+                self.activity[var] += 1.0
+                if self.levels[var] >= level:
+                    pending += 1
+                else:
+                    learned.append(other)
+            while abs(self.trail[position]) not in seen:
+                position -= 1
+            lit = self.trail[position]
+            position -= 1
+            seen.discard(abs(lit))
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.clauses[self.reasons[abs(lit)]]
+        learned[0] = -lit
+
+        backjump = 0
+        if len(learned) > 1:
+            best = max(range(1, len(learned)), key=lambda i: self.levels[abs(learned[i])])
+            learned[1], learned[best] = learned[best], learned[1]
+            backjump = self.levels[abs(learned[1])]
+        return learned, backjump
+
+    def _cancel_until(self, level):
+        if len(self.trail_limits) <= level:
+            return
+        limit = self.trail_limits[level]
+        for lit in self.trail[limit:]:
+            var = abs(lit)
+            self.values[var] = 0
+            self.reasons[var] = None
+        del self.trail[limit:]
+        del self.trail_limits[level:]
+        self.queue_head = len(self.trail)
+
+    def _pick_branch_var(self):
+        best, best_activity = 0, -1.0
+        values, activity = self.values, self.activity
+        for var in self.decision_vars:
+            if values[var] == 0 and activity[var] > best_activity:
+                best, best_activity = var, self.activity[var]
+        return best
+
+    def solve(self, assumptions=()):
+        if not self.ok:
+            return False
+        try:
+            while True:
+                conflict = self._propagate()
+                if conflict is not None:
+                    if not self.trail_limits:
+                        self.ok = False
+                        return False
+                    learned, backjump = self._analyze(conflict)
+                    self._cancel_until(backjump)
+                    if len(learned) == 1:
+                        self._assign(learned[0], None)
+                    else:
+                        self.num_learned += 1
+                        self._assign(learned[0], self._attach(learned))
+                    continue
+
+                level = len(self.trail_limits)
+                if level < len(assumptions):
+                    lit = assumptions[level]
+                    value = self.value(lit)
+                    if value == -1:
+                        return False
+                    self.trail_limits.append(len(self.trail))
+                    if value == 0:
+                        self._assign(lit, None)
+                    continue
+
+                var = self._pick_branch_var()
+                if var == 0:
+                    # Variables still unassigned here are unconstrained and
+                    # may take either value
+                    self.model = list(self.values)
+                    return True
+                self.trail_limits.append(len(self.trail))
+                # Most cells hold nothing, so try false first
+                self._assign(-var, None)
+        finally:
+            self._cancel_until(0)
+
+
+class PropositionalInference:
+    # Inference backend for LogicAgent. The percept axioms go into a
+    # DPLLSolver as CNF over one pit and one Wumpus variable per cell, and
+    # each unvisited cell next to a visited one is classified by asking the
+    # solver whether a pit or Wumpus there is consistent with everything
+    # perceived so far. Percepts arrive as the world's percept bits.
+    def __init__(self):
+        self.solver = DPLLSolver()
+        self.grid_size = None
+        self.topology = None
+        self.pit_vars = {}
+        self.wumpus_vars = {}
+        self.wumpus_alive = True
+        # Cells that can hold the Wumpus given every stench so far; None
+        # until the first stench
+        self.wumpus_candidates = None
+        self.observed = set()
+        self.undecided = set()
+        # Variables mentioned by clauses added since the last inference
+        # round, and how much of the level-0 trail that round had seen
+        self.touched = set()
+        self.trail_mark = 0
+
+    def neighbours(self, cell):
+        return self.topology.neighbours(*cell)
+
+    def pit(self, cell):
+        var = self.pit_vars.get(cell)
+        if var is None:
+            var = self.pit_vars[cell] = self.solver.new_var()
+        return var
+
+    def wumpus(self, cell):
+        var = self.wumpus_vars.get(cell)
+        if var is None:
+            var = self.wumpus_vars[cell] = self.solver.new_var()
+            if self.wumpus_candidates is not None and cell not in self.wumpus_candidates:
+                self.add([-var])
+        return var
+
+    def add(self, clause):
+        self.touched.update(abs(lit) for lit in clause)
+        self.solver.add_clause(clause)
+
+    def tell(self, cell, percepts):
+        neighbours = self.neighbours(cell)
+        self.add([-self.pit(cell)])
+        if percepts & BREEZE_BIT:
+            self.add([self.pit(n) for n in neighbours])
+        else:
+            for n in neighbours:
+                self.add([-self.pit(n)])
+
+        if not self.wumpus_alive:
+            # Stench is gone once the Wumpus is dead, so it says nothing
+            return
+        self.add([-self.wumpus(cell)])
+        if percepts & STENCH_BIT:
+            self.add([self.wumpus(n) for n in neighbours])
+            if self.wumpus_candidates is None:
+                # There is only one Wumpus
+                self.wumpus_candidates = set(neighbours)
+                for i, a in enumerate(neighbours):
+                    for b in neighbours[i + 1:]:
+                        self.add([-self.wumpus(a), -self.wumpus(b)])
+            else:
+                self.wumpus_candidates &= set(neighbours)
+            for other, var in list(self.wumpus_vars.items()):
+                if other not in self.wumpus_candidates:
+                    self.add([-var])
+        else:
+            for n in neighbours:
+                self.add([-self.wumpus(n)])
+
+    def affected_vars(self, seeds):
+        # Variables that share a live clause with the seeds, directly or
+        # through other variables. A cell's status can only change if one
+        # of its variables is in this set. Clauses already satisfied at
+        # level 0 link nothing, except the ones a seed may just have
+        # satisfied.
+        solver = self.solver
+        seen = set(seeds)
+        stack = [(var, True) for var in seeds]
+        while stack:
+            var, is_seed = stack.pop()
+            for index in solver.occurrences[var]:
+                clause = solver.clauses[index]
+                if clause is None:
+                    continue
+                if not is_seed and any(solver.value(lit) == 1 for lit in clause):
+                    continue
+                for lit in clause:
+                    other = abs(lit)
+                    if other not in seen:
+                        seen.add(other)
+                        stack.append((other, False))
+        return seen
+
+    def possible(self, lit, models):
+        # Whether lit is consistent with the knowledge base. Level-0 facts
+        # answer directly, and so does any model found earlier in the same
+        # round; only then is the solver asked.
+        value = self.solver.value(lit)
+        if value:
+            return value == 1
+        var = abs(lit)
+        for model in models:
+            value = model[var] if var < len(model) else 0
+            if value == 0 or (value == 1) == (lit > 0):
+                return True
+        if self.solver.solve([lit]):
+            models.append(self.solver.model)
+            return True
+        return False
+
+    def update(self, agent, pos, percepts):
+        if self.grid_size is None:
+            self.grid_size = agent.world.grid_size
+            self.topology = grid_topology(self.grid_size)
+        agent.safe.add(pos)
+        agent.visited.add(pos)
+        agent.frontier.discard(pos)
+        changed = False
+
+        if percepts & GLITTER_BIT:
+            agent.gold_position = pos
+
+        full_round = False
+        if percepts & SCREAM_BIT and self.wumpus_alive:
+            self.wumpus_alive = False
+            changed = full_round = True
+            agent.wumpus_positions.clear()
+            agent.possible_wumpus.clear()
+            # Cells that were only dangerous because of the Wumpus get
+            # another look
+            for cell in list(agent.unsafe):
+                if cell not in agent.pit_positions:
+                    agent.unsafe.discard(cell)
+                    self.undecided.add(cell)
+
+        if pos not in self.observed:
+            self.observed.add(pos)
+            self.undecided.discard(pos)
+            agent.possible_pits.discard(pos)
+            agent.possible_wumpus.discard(pos)
+            if percepts & STENCH_BIT:
+                agent.stench_positions.add(pos)
+            if percepts & BREEZE_BIT:
+                agent.breeze_positions.add(pos)
+            self.tell(pos, percepts)
+            for n in self.neighbours(pos):
+                if n not in agent.visited and n not in agent.safe and n not in agent.unsafe:
+                    self.undecided.add(n)
+            changed = True
+
+        if changed:
+            self.infer(agent, full_round)
+
+    def infer(self, agent, full_round=False):
+        if full_round:
+            cells = list(self.undecided)
+        else:
+            # Variables fixed by propagation count as touched too
+            self.touched.update(abs(lit) for lit in self.solver.trail[self.trail_mark:])
+            affected = self.affected_vars(self.touched)
+            cells = [cell for cell in self.undecided
+                     if self.pit_vars.get(cell) in affected or self.wumpus_vars.get(cell) in affected]
+        self.touched = set()
+        self.solver.simplify()
+        self.trail_mark = len(self.solver.trail)
+
+        models = []
+        for cell in cells:
+            pit = self.pit(cell)
+            pit_possible = self.possible(pit, models)
+            wumpus_possible = False
+            if self.wumpus_alive:
+                wumpus = self.wumpus(cell)
+                wumpus_possible = self.possible(wumpus, models)
+
+            if not pit_possible and not wumpus_possible:
+                self.undecided.discard(cell)
+                agent.possible_pits.discard(cell)
+                agent.possible_wumpus.discard(cell)
+                agent.mark_safe(cell)
+                continue
+
+            if pit_possible and not self.possible(-pit, models):
+                self.undecided.discard(cell)
+                agent.pit_positions.add(cell)
+                agent.unsafe.add(cell)
+            if wumpus_possible and not self.possible(-wumpus, models):
+                self.undecided.discard(cell)
+                agent.wumpus_positions.add(cell)
+                agent.unsafe.add(cell)
+
+            if pit_possible:
+                agent.possible_pits.add(cell)
+            if wumpus_possible and cell not in agent.wumpus_positions:
+                agent.possible_wumpus.add(cell)
+            else:
+                agent.possible_wumpus.discard(cell)
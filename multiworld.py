@@ -0,0 +1,297 @@
+import argparse
+import random
+import time
+from collections import Counter
+from functools import partial
+
+from wampusworld import (BREEZE_BIT, BUMP_BIT, EXIT, GLITTER_BIT, KNOWLEDGE_SETS, RIGHT,
+                         SCREAM_BIT, STENCH_BIT, VERSIONED_SETS, KnowledgeSet, LogicAgent,
+                         PlanCache, WumpusWorld, grid_topology)
+
+
+class MultiWumpusWorld:
+    # One grid played by many agents at once, with any number of Wumpuses
+    # and gold pieces. Every agent enters and leaves through (0, 0), has its
+    # own arrow and acts through its own AgentView, which looks like a
+    # WumpusWorld to a LogicAgent. The layout is kept once, in flat per-cell
+    # arrays (index x * grid_size + y) read by every view. Breeze never
+    # changes; stench is a count of live adjacent Wumpuses, and a kill only
+    # decrements the counts around the dead Wumpus.
+    def __init__(self, grid_size=32, agent_count=8, wumpus_count=4, gold_count=1, pit_prob=0.2,
+                 seed=None, rng=None):
+        if wumpus_count + gold_count >= grid_size * grid_size:
+            raise ValueError("too many Wumpuses and gold pieces for the grid")
+        self.grid_size = grid_size
+        self.topology = grid_topology(grid_size)
+        self.pit_prob = pit_prob
+        self.seed = seed
+        # Without a seed or rng the global random module is used
+        if rng is None:
+            rng = random.Random(seed) if seed is not None else random
+        self.rng = rng
+        cells = grid_size * grid_size
+        self.pits = bytearray(cells)
+        # 1 while a live Wumpus is in the cell
+        self.wumpus = bytearray(cells)
+        self.gold = bytearray(cells)
+        self.generate_world(wumpus_count, gold_count)
+        self.wumpuses_alive = wumpus_count
+
+        self.breeze = bytearray(cells)
+        self.stench = bytearray(cells)
+        neighbour_cells = self.topology.neighbour_cells
+        for cell in range(cells):
+            if self.pits[cell]:
+                for other in neighbour_cells(cell):
+                    self.breeze[other] = 1
+            if self.wumpus[cell]:
+                for other in neighbour_cells(cell):
+                    self.stench[other] += 1
+
+        self.agents = [AgentView(self, index) for index in range(agent_count)]
+        self.controllers = []
+        self.ticks = 0
+
+    def generate_world(self, wumpus_count, gold_count):
+        n = self.grid_size
+        occupied = {0}  # Start cell must remain empty
+        for layer, count in ((self.wumpus, wumpus_count), (self.gold, gold_count)):
+            for _ in range(count):
+                while True:
+                    cell = self.rng.randint(0, n - 1) * n + self.rng.randint(0, n - 1)
+                    if cell not in occupied:
+                        layer[cell] = 1
+                        occupied.add(cell)
+                        break
+        for cell in range(n * n):
+            if cell not in occupied and self.rng.random() < self.pit_prob:
+                self.pits[cell] = 1
+
+    def sense(self, cell):
+        return ((STENCH_BIT if self.stench[cell] else 0) | (BREEZE_BIT if self.breeze[cell] else 0) |
+                (GLITTER_BIT if self.gold[cell] else 0))
+
+    def shoot(self, x, y, heading):
+        # The first live Wumpus in the line of fire dies
+        n = self.grid_size
+        for i, j in self.topology.ray(x, y, heading):
+            cell = i * n + j
+            if self.wumpus[cell]:
+                self.wumpus[cell] = 0
+                self.wumpuses_alive -= 1
+                for other in self.topology.neighbour_cells(cell):
+                    self.stench[other] -= 1
+                return True
+        return False
+
+    def take_gold(self, cell):
+        if self.gold[cell]:
+            self.gold[cell] = 0
+            return True
+        return False
+
+    def run_agents(self, max_ticks=1000, agent_factory=None, store=None):
+        # Plays until every agent has won or lost, or for max_ticks ticks.
+        # In a tick every agent still playing decides and acts in turn, so
+        # later agents see what earlier ones changed. agent_factory is
+        # called with each AgentView; by default the agents are
+        # MultiLogicAgents sharing store (a new SharedKnowledge if None).
+        # Agents with a record_loss method are told where they died.
+        # Returns every agent's outcome: "win", "lose" or "continue".
+        if agent_factory is None:
+            agent_factory = partial(MultiLogicAgent, store=store if store is not None else SharedKnowledge())
+        self.controllers = [agent_factory(view) for view in self.agents]
+        playing = [(view, controller) for view, controller in zip(self.agents, self.controllers)
+                   if view.status == "continue"]
+        while playing and self.ticks < max_ticks:
+            self.ticks += 1
+            still_playing = []
+            for view, controller in playing:
+                action = controller.decide_action()
+                view.steps_taken += 1
+                if action == EXIT or action == "exit":
+                    view.status = "win"
+                    continue
+                view.execute_action(action)
+                view.status = view.is_game_over()
+                if view.status == "continue":
+                    still_playing.append((view, controller))
+                elif view.status == "lose" and hasattr(controller, "record_loss"):
+                    controller.record_loss(view.agent_pos)
+            playing = still_playing
+        return [view.status for view in self.agents]
+
+
+class AgentView:
+    # One agent's side of a MultiWumpusWorld: its own position, heading,
+    # arrow, gold and percepts, and the WumpusWorld attributes and actions a
+    # LogicAgent uses. wumpus_alive is True while any Wumpus lives, and
+    # only the shooter hears the scream.
+    def __init__(self, game, index):
+        self.game = game
+        self.index = index
+        self.grid_size = game.grid_size
+        self.topology = game.topology
+        self.agent_pos = (0, 0)
+        self.heading = RIGHT
+        self.has_gold = False
+        self.has_arrow = True
+        self.percept_bits = game.sense(0)
+        self.status = "continue"
+        self.steps_taken = 0
+
+    # The string API of WumpusWorld works the same way here
+    agent_dir = WumpusWorld.agent_dir
+    percepts = WumpusWorld.percepts
+    execute_action = WumpusWorld.execute_action
+
+    @property
+    def wumpus_alive(self):
+        return self.game.wumpuses_alive > 0
+
+    def move_forward(self):
+        x, y = self.agent_pos
+        new_pos = self.topology.ahead(x, y, self.heading)
+        if new_pos is None:
+            self.percept_bits |= BUMP_BIT
+            return False
+        self.agent_pos = new_pos
+        self.percept_bits = self.game.sense(new_pos[0] * self.grid_size + new_pos[1])
+        return True
+
+    def turn_left(self):
+        self.heading = self.topology.turn_left[self.heading]
+        self.percept_bits = self.game.sense(self.agent_pos[0] * self.grid_size + self.agent_pos[1])
+        return True
+
+    def turn_right(self):
+        self.heading = self.topology.turn_right[self.heading]
+        self.percept_bits = self.game.sense(self.agent_pos[0] * self.grid_size + self.agent_pos[1])
+        return True
+
+    def shoot_arrow(self):
+        if not self.has_arrow:
+            return False
+        self.has_arrow = False
+        if self.game.shoot(self.agent_pos[0], self.agent_pos[1], self.heading):
+            self.percept_bits |= SCREAM_BIT
+            return True
+        return False
+
+    def grab_gold(self):
+        # Glitter is cleared either way: another agent may have taken the
+        # gold since it was seen
+        x, y = self.agent_pos
+        self.percept_bits &= ~GLITTER_BIT
+        if self.has_gold or not self.game.take_gold(x * self.grid_size + y):
+            return False
+        self.has_gold = True
+        return True
+
+    def _no_op(self):
+        return True
+
+    ACTION_TABLE = (move_forward, turn_left, turn_right, shoot_arrow, grab_gold, _no_op, _no_op)
+
+    def is_game_over(self):
+        x, y = self.agent_pos
+        cell = x * self.grid_size + y
+        if self.game.pits[cell] or self.game.wumpus[cell]:
+            return "lose"
+        if self.has_gold and self.agent_pos == (0, 0):
+            return "win"
+        return "continue"
+
+
+class SharedKnowledge:
+    # Knowledge sets shared by every MultiLogicAgent built with this store,
+    # plus one plan cache. The rules run once for each distinct percept at
+    # a cell, for whichever agent feels it first; agents passing through
+    # later find the facts already there. Plans only depend on the shared
+    # sets, the start and the heading, so agents also reuse each other's.
+    def __init__(self, plan_cache_size=4096):
+        for name in KNOWLEDGE_SETS:
+            setattr(self, name, KnowledgeSet() if name in VERSIONED_SETS else set())
+        self.visited.add((0, 0))
+        self.safe.add((0, 0))
+        # Stench and breeze bits last reasoned about at each cell
+        self.observed = {}
+        self.skipped = 0
+        self.plan_cache = PlanCache(plan_cache_size)
+
+    def observe(self, cell, percepts):
+        # False if these percepts at cell have been reasoned about already
+        if self.observed.get(cell) == percepts:
+            self.skipped += 1
+            return False
+        self.observed[cell] = percepts
+        return True
+
+
+class MultiLogicAgent(LogicAgent):
+    # LogicAgent for a MultiWumpusWorld whose knowledge sets and plan cache
+    # are those of a SharedKnowledge store (a private one by default).
+    # Clones and restored agents get their own copies of the sets and stop
+    # sharing.
+    def __init__(self, world, store=None, plan_cache_size=256):
+        super().__init__(world, plan_cache_size)
+        self.store = store if store is not None else SharedKnowledge(plan_cache_size)
+        for name in KNOWLEDGE_SETS:
+            setattr(self, name, getattr(self.store, name))
+        self.plan_cache = self.store.plan_cache
+
+    def sharing(self):
+        return self.safe is self.store.safe
+
+    def update_knowledge(self):
+        x, y = self.world.agent_pos
+        percepts = self.world.percept_bits
+        if percepts & GLITTER_BIT:
+            self.gold_position = (x, y)
+        # A scream only tells the shooter that some Wumpus died, not which
+        # one; the stench around it fades and later percepts show it
+        percepts &= STENCH_BIT | BREEZE_BIT
+        if not self.sharing() or self.store.observe((x, y), percepts):
+            self.apply_percepts(x, y, percepts)
+
+    def record_loss(self, cell):
+        # Agents sharing the store avoid the cell from now on; paths planned
+        # through it are replanned on their next step, as unsafe changed
+        self.unsafe.add(cell)
+        self.frontier.discard(cell)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many agents on one multi-Wumpus grid")
+    parser.add_argument("--grid-size", type=int, default=64)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--wumpuses", type=int, default=16)
+    parser.add_argument("--gold", type=int, default=50)
+    parser.add_argument("--pit-prob", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=1000)
+    parser.add_argument("--private", action="store_true",
+                        help="give every agent its own knowledge store instead of a shared one")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    game = MultiWumpusWorld(args.grid_size, args.agents, args.wumpuses, args.gold, args.pit_prob,
+                            seed=args.seed)
+    store = None if args.private else SharedKnowledge()
+    factory = MultiLogicAgent if args.private else partial(MultiLogicAgent, store=store)
+    outcomes = Counter(game.run_agents(args.max_ticks, factory))
+    elapsed = time.perf_counter() - start
+
+    steps = sum(view.steps_taken for view in game.agents)
+    print(f"{args.agents} agents, {game.ticks} ticks, {steps} agent steps in {elapsed:.2f}s "
+          f"({steps / elapsed:.0f} steps/s)")
+    print(", ".join(f"{outcome}: {outcomes[outcome]}" for outcome in ("win", "lose", "continue")))
+    print(f"Wumpuses left: {game.wumpuses_alive}")
+    if store is not None:
+        cache = store.plan_cache.stats()
+        print(f"Percepts already known: {store.skipped}; plan cache {cache['hits']} hits, "
+              f"{cache['misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+from corpus import LABELS, CorpusReader
+from tournament import AGENTS
+from wampusworld import GRAB_GOLD, MOVE_FORWARD, SHOOT, TURN_LEFT, TURN_RIGHT
+
+# Search states are ints packing (cell, heading, has_arrow, wumpus_alive,
+# has_gold), gold in the lowest bit
+ARROW, ALIVE, GOLD = 4, 2, 1
+
+
+def solve(world):
+    # Shortest action sequence from the world's current state that grabs
+    # the gold and gets back to (0, 0), or None if there is none. Reads the
+    # true grid and uses the world's own action semantics: bumps and missed
+    # shots change nothing useful, so moves into walls and shots that do not
+    # kill the Wumpus are not tried. Breadth-first over every reachable
+    # state, each visited once.
+    n = world.grid_size
+    grid = world.world
+    forward = world.topology.forward
+    turn_left = world.topology.turn_left
+    turn_right = world.topology.turn_right
+    pit = [grid[x][y]["pit"] for x in range(n) for y in range(n)]
+    wumpus = [grid[x][y]["wumpus"] for x in range(n) for y in range(n)]
+    gold = [grid[x][y]["gold"] for x in range(n) for y in range(n)]
+
+    x, y = world.agent_pos
+    start = ((((x * n + y) * 4 + world.heading) * 8) |
+             (ARROW if world.has_arrow else 0) | (ALIVE if world.wumpus_alive else 0) |
+             (GOLD if world.has_gold else 0))
+    if world.has_gold and (x, y) == (0, 0):
+        return []
+    parents = {start: None}
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for state in frontier:
+            flags = state & 7
+            cell, heading = divmod(state >> 3, 4)
+            successors = [(((cell * 4 + turn_left[heading]) << 3) | flags, TURN_LEFT),
+                          (((cell * 4 + turn_right[heading]) << 3) | flags, TURN_RIGHT)]
+            ahead = forward(cell)[heading]
+            if ahead >= 0 and not pit[ahead] and not (wumpus[ahead] and flags & ALIVE):
+                successors.append((((ahead * 4 + heading) << 3) | flags, MOVE_FORWARD))
+            if gold[cell] and not flags & GOLD:
+                successors.append((state | GOLD, GRAB_GOLD))
+            if flags & ARROW and flags & ALIVE:
+                # Only a shot that kills is worth its step
+                target = ahead
+                while target >= 0 and not wumpus[target]:
+                    target = forward(target)[heading]
+                if target >= 0:
+                    successors.append((state & ~(ARROW | ALIVE), SHOOT))
+
+            for successor, action in successors:
+                if successor in parents:
+                    continue
+                parents[successor] = (state, action)
+                if successor & GOLD and successor >> 5 == 0:
+                    # Back at (0, 0) with the gold: the game is won
+                    path = []
+                    while parents[successor] is not None:
+                        successor, action = parents[successor]
+                        path.append(action)
+                    path.reverse()
+                    return path
+                next_frontier.append(successor)
+        frontier = next_frontier
+    return None
+
+
+def optimal_steps(world):
+    # Length of the shortest winning sequence, -1 if the world is unsolvable
+    path = solve(world)
+    return -1 if path is None else len(path)
+
+
+def _evaluate_chunk(args):
+    path, indices, agent_name, max_steps = args
+    rows = []
+    with CorpusReader(path) as reader:
+        for index in indices:
+            entry = reader[index]
+            optimal = optimal_steps(entry.world())
+            status, steps = None, 0
+            if agent_name is not None:
+                world = entry.world()
+                status = world.run_agent(max_steps=max_steps, verbose=False,
+                                         agent_factory=AGENTS[agent_name])
+                steps = world.steps_taken
+            rows.append((index, entry.grid_size, entry.label, optimal, status, steps))
+    return rows
+
+
+def evaluate_corpus(path, agent_name="logic", workers=None, max_steps=1000, label=None,
+                    chunk_size=64):
+    # One row per world: (index, grid size, label, optimal steps or -1,
+    # agent outcome, agent steps). With agent_name None only the oracle
+    # runs. Worlds are split across worker processes in chunks.
+    with CorpusReader(path) as reader:
+        indices = reader.select(label)
+    chunks = [(path, indices[start:start + chunk_size], agent_name, max_steps)
+              for start in range(0, len(indices), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = map(_evaluate_chunk, chunks)
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_evaluate_chunk, chunks)
+    return sorted(row for rows in results for row in rows)
+
+
+def summarize(rows):
+    # Splits failures into "agent failed" (the oracle wins) and "unsolvable",
+    # and measures the wins against the optimal step count
+    summary = Counter()
+    gaps = []
+    for _, _, _, optimal, status, steps in rows:
+        if optimal < 0:
+            summary["unsolvable"] += 1
+            continue
+        summary["solvable"] += 1
+        if status == "win":
+            summary["agent_won"] += 1
+            gaps.append((steps, optimal))
+        elif status is not None:
+            summary["agent_failed"] += 1
+    result = dict(summary)
+    if gaps:
+        result["mean_step_gap"] = sum(steps - optimal for steps, optimal in gaps) / len(gaps)
+        result["mean_efficiency"] = sum(optimal / steps for steps, optimal in gaps) / len(gaps)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an agent with the optimal solution on a corpus")
+    parser.add_argument("corpus")
+    parser.add_argument("--agent", choices=sorted(AGENTS), default="logic")
+    parser.add_argument("--oracle-only", action="store_true", help="only solve the worlds")
+    parser.add_argument("--label", choices=LABELS, help="only use corpus worlds with this label")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    args = parser.parse_args()
+
+    rows = evaluate_corpus(args.corpus, None if args.oracle_only else args.agent, args.workers,
+                           args.max_steps, args.label)
+    by_size = {}
+    for row in rows:
+        by_size.setdefault(row[1], []).append(row)
+    for grid_size, size_rows in sorted(by_size.items()):
+        summary = summarize(size_rows)
+        line = (f"{grid_size:>5}: {len(size_rows)} worlds, {summary.get('solvable', 0)} solvable, "
+                f"{summary.get('unsolvable', 0)} unsolvable")
+        if not args.oracle_only:
+            line += (f"; {args.agent} won {summary.get('agent_won', 0)}, "
+                     f"failed {summary.get('agent_failed', 0)} solvable")
+            if "mean_step_gap" in summary:
+                line += (f", {summary['mean_step_gap']:.1f} steps over optimal "
+                         f"({summary['mean_efficiency']:.1%} efficiency)")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
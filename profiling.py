@@ -0,0 +1,146 @@
+import json
+import time
+from bisect import bisect_left
+
+# Bucket upper bounds. Latencies go from 1us to ~17s and counts from 1 to
+# ~16M, doubling each bucket; anything larger lands in the +Inf bucket.
+LATENCY_BOUNDS = tuple(1e-6 * 2 ** i for i in range(25))
+COUNT_BOUNDS = tuple(float(2 ** i) for i in range(25))
+
+
+class Histogram:
+    __slots__ = ("bounds", "unit", "buckets", "count", "total", "max")
+
+    def __init__(self, bounds=LATENCY_BOUNDS, unit="seconds"):
+        self.bounds = bounds
+        self.unit = unit
+        # One bucket per bound plus the +Inf bucket; not cumulative
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise ValueError("cannot merge histograms with different buckets")
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation, capped at
+        # the largest value seen
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "unit": self.unit,
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): count for bound, count
+                        in zip(self.bounds + (float("inf"),), self.buckets) if count},
+        }
+
+
+class Profiler:
+    # Collects per-phase latency histograms for one or more episodes. Pass
+    # it to run_agent(profiler=...), which times every step; the agent's
+    # decide_action, update_knowledge and plan_path_to_safe and the world's
+    # execute_action are wrapped on the instance, so agents run without a
+    # profiler are not slowed down at all.
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name, bounds=LATENCY_BOUNDS, unit="seconds"):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(bounds, unit)
+        return histogram
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def timed(self, name, function):
+        histogram = self.histogram(name)
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+    def instrument(self, agent):
+        # decide_action calls update_knowledge and plan_path_to_safe through
+        # self, so instance attributes shadowing them are picked up
+        for name in ("decide_action", "update_knowledge", "plan_path_to_safe"):
+            setattr(agent, name, self.timed(name, getattr(agent, name)))
+        world = agent.world
+        world.execute_action = self.timed("execute_action", world.execute_action)
+
+        # Only searches that miss the plan cache expand any nodes
+        expanded = self.histogram("plan_nodes_expanded", COUNT_BOUNDS, "")
+        peak = self.histogram("plan_queue_peak", COUNT_BOUNDS, "")
+        for name in ("search_path", "goal_table"):
+            setattr(agent, name, self.counted(agent, getattr(agent, name), expanded, peak))
+        return agent
+
+    def counted(self, agent, search, expanded, peak):
+        def counted_search(*args, **kwargs):
+            result = search(*args, **kwargs)
+            nodes, queue = agent.last_search
+            expanded.observe(nodes)
+            peak.observe(queue)
+            return result
+        return counted_search
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            if name in self.histograms:
+                self.histograms[name].merge(histogram)
+            else:
+                merged = self.histogram(name, histogram.bounds, histogram.unit)
+                merged.merge(histogram)
+        return self
+
+    def to_dict(self):
+        return {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix="wumpus"):
+        # Prometheus text exposition format, one histogram per phase
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}" + (f"_{histogram.unit}" if histogram.unit else "")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.buckets):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.total:g}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
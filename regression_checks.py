@@ -0,0 +1,795 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+from wampusworld import (BREEZE_BIT, EXIT, STENCH_BIT, GridTopology, LogicAgent, WumpusWorld,
+                         grid_topology)
+
+# Each check plays or builds its cases from fixed seeds and raises
+# CheckFailed on the first mismatch. It returns the number of cases checked.
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+def check_bitboard(grid_sizes=(3, 4, 8, 70), episodes=400, seed=0, max_steps=300):
+    # BitboardAgent against LogicAgent on the same worlds: same action at
+    # every step, same knowledge sets and the same outcome. 70x70 is past
+    # PRECOMPUTE_LIMIT, where neighbour masks are built on the fly.
+    from bitboard import BitboardAgent
+    from wampusworld import KNOWLEDGE_SETS
+
+    checked = 0
+    for grid_size in grid_sizes:
+        for episode in range(episodes if grid_size <= 8 else episodes // 10):
+            worlds = [WumpusWorld(grid_size, 0.2, seed=seed + episode) for _ in range(2)]
+            agents = [LogicAgent(worlds[0]), BitboardAgent(worlds[1])]
+            where = f"{grid_size}x{grid_size} seed {seed + episode}"
+            for step in range(max_steps):
+                actions = [agent.decide_action() for agent in agents]
+                expect(actions[0] == actions[1],
+                       f"{where} step {step}: actions {actions[0]} and {actions[1]} differ")
+                for name in KNOWLEDGE_SETS:
+                    expect(set(getattr(agents[0], name)) == set(getattr(agents[1], name)),
+                           f"{where} step {step}: {name} differs")
+                checked += 1
+                if actions[0] == EXIT:
+                    break
+                for agent in agents:
+                    agent.execute_action(actions[0])
+                outcomes = [world.is_game_over() for world in worlds]
+                expect(outcomes[0] == outcomes[1], f"{where} step {step}: outcomes differ")
+                if outcomes[0] != "continue":
+                    break
+    return checked
+
+
+def bfs_distance(agent, start, heading, targets, enter_target=None):
+    # Plain breadth-first search over (cell, heading) with the same move
+    # rules as LogicAgent.search_path
+    n = agent.world.grid_size
+    forward = agent.world.topology.forward
+    start_state = (start[0] * n + start[1]) * 4 + heading
+    distance = {start_state: 0}
+    queue = deque([start_state])
+    while queue:
+        state = queue.popleft()
+        cell, heading = divmod(state, 4)
+        if divmod(cell, n) in targets:
+            return distance[state]
+        successors = [cell * 4 + GridTopology.turn_left[heading],
+                      cell * 4 + GridTopology.turn_right[heading]]
+        next_cell = forward(cell)[heading]
+        if next_cell >= 0:
+            pos = divmod(next_cell, n)
+            if (pos in agent.safe and pos not in agent.unsafe) or pos == enter_target:
+                successors.append(next_cell * 4 + heading)
+        for next_state in successors:
+            if next_state not in distance:
+                distance[next_state] = distance[state] + 1
+                queue.append(next_state)
+    return None
+
+
+def follow(agent, start, heading, path, targets, enter_target=None):
+    # Walks path, checking every cell entered and where it ends
+    n = agent.world.grid_size
+    cell = start[0] * n + start[1]
+    for action in path:
+        if action == 0:
+            cell = agent.world.topology.forward(cell)[heading]
+            pos = divmod(cell, n)
+            expect(cell >= 0 and ((pos in agent.safe and pos not in agent.unsafe) or
+                                  pos == enter_target),
+                   f"path {path} from {start} enters {pos}")
+        elif action == 1:
+            heading = GridTopology.turn_left[heading]
+        else:
+            heading = GridTopology.turn_right[heading]
+    expect(divmod(cell, n) in targets, f"path {path} from {start} ends off target")
+
+
+def check_search(cases=2000, seed=0):
+    # search_path (A*, or uniform cost with several targets) against plain
+    # BFS on random knowledge: same length, or no path for both, and every
+    # path stays on cells it may enter
+    rng = random.Random(seed)
+    for case in range(cases):
+        n = rng.randint(2, 9)
+        agent = LogicAgent(WumpusWorld(world=[[{"pit": False, "wumpus": False, "gold": False}
+                                               for _ in range(n)] for _ in range(n)]))
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        for cell in cells:
+            if rng.random() < 0.7:
+                agent.safe.add(cell)
+            elif rng.random() < 0.5:
+                agent.unsafe.add(cell)
+        start = rng.choice(cells)
+        heading = rng.randrange(4)
+
+        target = rng.choice(cells)
+        enter = target if rng.random() < 0.3 else None
+        expected = bfs_distance(agent, start, heading, {target}, enter)
+        path = agent.search_path(start, heading, {target}, target, enter is not None)
+        expect((path is None) == (expected is None) and (path is None or len(path) == expected),
+               f"case {case}: A* to {target} gave {path}, BFS {expected}")
+        if path is not None:
+            follow(agent, start, heading, path, {target}, enter)
+
+        targets = set(rng.sample(cells, rng.randint(1, 4)))
+        expected = bfs_distance(agent, start, heading, targets)
+        path = agent.search_path(start, heading, targets)
+        expect((path is None) == (expected is None) and (path is None or len(path) == expected),
+               f"case {case}: search to {targets} gave {path}, BFS {expected}")
+        if path is not None:
+            follow(agent, start, heading, path, targets)
+    return cases
+
+
+def check_plan_cache(cases=2000, rounds=8, seed=0):
+    # plan_path_to_safe while knowledge keeps changing, against a fresh agent
+    # with no cache or plan: a path exactly when the fresh agent finds one,
+    # and only over cells it may enter now. A path planned from scratch (no
+    # plan kept from the last round) must be as short as the fresh one.
+    # Goal-table paths are checked against plain BFS.
+    rng = random.Random(seed)
+    hits = 0
+    for case in range(cases):
+        n = rng.randint(2, 7)
+        layout = [[{"pit": False, "wumpus": False, "gold": False} for _ in range(n)]
+                  for _ in range(n)]
+        agent = LogicAgent(WumpusWorld(world=layout))
+        cells = [(x, y) for x in range(n) for y in range(n)]
+        for cell in cells:
+            if rng.random() < 0.7:
+                agent.safe.add(cell)
+                if rng.random() < 0.3:
+                    agent.frontier.add(cell)
+        goal = (None, False)
+        for round in range(rounds):
+            where = f"case {case} round {round}"
+            for cell in rng.sample(cells, rng.randint(0, 3)):
+                change = rng.randrange(4)
+                if change == 0:
+                    agent.safe.add(cell)
+                elif change == 1:
+                    agent.safe.discard(cell)
+                    agent.frontier.discard(cell)
+                elif change == 2:
+                    agent.unsafe.symmetric_difference_update({cell})
+                elif cell in agent.safe:
+                    agent.frontier.symmetric_difference_update({cell})
+            if rng.random() < 0.3:
+                agent.world.agent_pos = rng.choice(cells)
+                agent.world.heading = rng.randrange(4)
+                agent.path = []
+            elif rng.random() < 0.3:
+                agent.path = []
+            if rng.random() < 0.5:
+                target = rng.choice(cells)
+                goal = (target, rng.random() < 0.3)
+            elif rng.random() < 0.5:
+                goal = (None, False)
+            target, risky = goal
+            start, heading = agent.world.agent_pos, agent.world.heading
+            kept = bool(agent.path) and agent.path_goal == goal
+
+            fresh = LogicAgent(WumpusWorld(world=layout), plan_cache_size=0)
+            fresh.world.agent_pos, fresh.world.heading = start, heading
+            for name in ("safe", "unsafe", "frontier"):
+                getattr(fresh, name).clear()
+                getattr(fresh, name).update(getattr(agent, name))
+            expected = fresh.plan_path_to_safe(target, risky)
+            found = agent.plan_path_to_safe(target, risky)
+            expect(found == expected, f"{where}: planning to {goal} gave {found}, "
+                   f"a fresh agent {expected}")
+            if found:
+                targets = {target} if target is not None else agent.frontier
+                follow(agent, start, heading, agent.path, targets, target if risky else None)
+                expect(kept or len(agent.path) == len(fresh.path),
+                       f"{where}: path {agent.path} to {goal}, fresh {fresh.path}")
+            else:
+                agent.path = []
+
+        target = rng.choice(cells)
+        enter = target if rng.random() < 0.3 else None
+        start, heading = rng.choice(cells), rng.randrange(4)
+        expected = bfs_distance(agent, start, heading, {target}, enter)
+        table = agent.goal_table(target, enter is not None)
+        path = agent.table_path(table, (start[0] * n + start[1]) * 4 + heading)
+        expect((path is None) == (expected is None) and (path is None or len(path) == expected),
+               f"case {case}: goal table to {target} gave {path}, BFS {expected}")
+        if path is not None:
+            follow(agent, start, heading, path, {target}, enter)
+        hits += agent.plan_cache.hits
+    expect(hits > 0, "no plan was ever served from the cache")
+    return cases * rounds
+
+
+def brute_force_sat(num_vars, clauses, assumptions=()):
+    for values in itertools.product((False, True), repeat=num_vars):
+        if any(values[abs(lit) - 1] != (lit > 0) for lit in assumptions):
+            continue
+        if all(any(values[abs(lit) - 1] == (lit > 0) for lit in clause) for clause in clauses):
+            return True
+    return False
+
+
+def check_dpll_solver(cases=400, seed=0):
+    # DPLLSolver against exhaustive search on small random CNFs, solved
+    # incrementally: clauses arrive in rounds, each round solved under a few
+    # assumption sets, with simplify() in between
+    from inference import DPLLSolver
+
+    rng = random.Random(seed)
+    for case in range(cases):
+        num_vars = rng.randint(1, 10)
+        solver = DPLLSolver()
+        for _ in range(num_vars):
+            solver.new_var()
+        clauses = []
+        for _ in range(rng.randint(1, 4)):
+            for _ in range(rng.randint(1, 2 * num_vars)):
+                width = rng.randint(1, 3)
+                clause = [rng.choice((1, -1)) * rng.randint(1, num_vars) for _ in range(width)]
+                clauses.append(clause)
+                solver.add_clause(clause)
+            solver.simplify()
+            for _ in range(3):
+                assumptions = [rng.choice((1, -1)) * var
+                               for var in rng.sample(range(1, num_vars + 1),
+                                                     rng.randint(0, min(3, num_vars)))]
+                expected = brute_force_sat(num_vars, clauses, assumptions)
+                result = solver.solve(assumptions)
+                expect(result == expected,
+                       f"case {case}: solve({assumptions}) gave {result} for {clauses}")
+                if result:
+                    model = solver.model
+                    for clause in clauses + [[lit] for lit in assumptions]:
+                        # Tautologies are dropped, so their variable may be left free
+                        expect(any(model[abs(lit)] == (1 if lit > 0 else -1) or -lit in clause
+                                   for lit in clause),
+                               f"case {case}: model {model} breaks {clause}")
+    return cases
+
+
+def consistent_worlds(grid_size):
+    # Every layout the generator can make, ignoring gold: one Wumpus off
+    # (0, 0) and any set of pits off (0, 0) and the Wumpus. Cells are bits
+    # x * grid_size + y; returns arrays of (Wumpus cell, pit mask, breeze mask,
+    # stench mask), one entry per layout.
+    import numpy as np
+
+    topology = grid_topology(grid_size)
+    cells = grid_size * grid_size
+    neighbours = [sum(1 << other for other in topology.neighbour_cells(cell))
+                  for cell in range(cells)]
+    pits = np.arange(1 << cells, dtype=np.int64)
+    pits = pits[(pits & 1) == 0]
+    breeze = np.zeros_like(pits)
+    for cell in range(cells):
+        breeze |= np.where((pits >> cell) & 1 == 1, neighbours[cell], 0)
+    wumpus, pit, breezes, stench = [], [], [], []
+    for cell in range(1, cells):
+        free = (pits >> cell) & 1 == 0
+        wumpus.append(np.full(free.sum(), cell, dtype=np.int64))
+        pit.append(pits[free])
+        breezes.append(breeze[free])
+        stench.append(np.full(free.sum(), neighbours[cell], dtype=np.int64))
+    return (np.concatenate(wumpus), np.concatenate(pit), np.concatenate(breezes),
+            np.concatenate(stench))
+
+
+def check_dpll_soundness(grid_sizes=(3, 4), episodes=60, seed=0, max_steps=100):
+    # Plays the dpll agent and, after every step, enumerates all layouts that
+    # agree with what it has perceived. A cell it holds safe must be free of
+    # pits, and of the Wumpus while it lives, in every one of them.
+    import numpy as np
+
+    from inference import PropositionalInference
+
+    checked = 0
+    for grid_size in grid_sizes:
+        wumpus, pits, breeze, stench = consistent_worlds(grid_size)
+        for episode in range(episodes):
+            world = WumpusWorld(grid_size, 0.2, seed=seed + episode)
+            inference = PropositionalInference()
+            agent = LogicAgent(world, inference=inference)
+            # Percepts at each cell's first visit, and whether the Wumpus was
+            # alive then; later visits tell the agent nothing new
+            visited = breezy = alive_visited = smelly = 0
+            for step in range(max_steps):
+                action = agent.decide_action()
+                x, y = world.agent_pos
+                bit = 1 << (x * grid_size + y)
+                if not visited & bit:
+                    visited |= bit
+                    if world.percept_bits & BREEZE_BIT:
+                        breezy |= bit
+                    if inference.wumpus_alive:
+                        alive_visited |= bit
+                        if world.percept_bits & STENCH_BIT:
+                            smelly |= bit
+
+                match = (((pits & visited) == 0) & ((breeze & visited) == breezy) &
+                         ((stench & alive_visited) == smelly) &
+                         (((1 << wumpus) & alive_visited) == 0))
+                expect(match.any(), f"{grid_size}x{grid_size} seed {seed + episode} step {step}: "
+                       "no layout matches the percepts")
+                danger = int(np.bitwise_or.reduce(pits[match]))
+                if inference.wumpus_alive:
+                    danger |= int(np.bitwise_or.reduce(1 << wumpus[match]))
+                for cx, cy in agent.safe:
+                    expect(not danger >> (cx * grid_size + cy) & 1,
+                           f"{grid_size}x{grid_size} seed {seed + episode} step {step}: "
+                           f"({cx}, {cy}) is marked safe but may hold a hazard")
+                checked += 1
+
+                if action == EXIT:
+                    break
+                agent.execute_action(action)
+                if world.is_game_over() != "continue":
+                    break
+    return checked
+
+
+def world_state(world):
+    return (world.agent_pos, world.heading, world.has_arrow, world.wumpus_alive, world.has_gold,
+            world.percept_bits)
+
+
+def check_trace(grid_sizes=(4, 8), episodes=150, seed=0):
+    # Plays episodes into a trace file, then reads them back: seed, outcome,
+    # layout, actions and percepts must match what was played, and
+    # world_at(step) must replay to the state the world was in after that
+    # step. A record cut short at the end of the file must be skipped.
+    from episode_trace import EPISODE_HEADER, TraceReader, TraceWriter
+
+    played = []
+
+    class Recorder(TraceWriter):
+        # Also keeps what the trace should hold
+        def begin(self, world):
+            super().begin(world)
+            self.world = world
+            self.start = bytes(self.layout)
+            self.codes = []
+            self.states = [world_state(world)]
+
+        def step(self, action, percepts):
+            super().step(action, percepts)
+            self.codes.append(action)
+            self.states.append(world_state(self.world))
+
+        def end(self, outcome):
+            super().end(outcome)
+            played.append((self.world.seed, outcome, self.start, self.codes, self.states))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "episodes.trace")
+        for grid_size in grid_sizes:
+            # Appending to an existing trace keeps its episodes
+            with Recorder(path) as recorder:
+                for episode in range(episodes):
+                    world = WumpusWorld(grid_size, 0.2, seed=seed + episode)
+                    if episode % 50 == 0:
+                        # Layouts built by hand have no seed
+                        world = WumpusWorld(world=world.world)
+                    world.run_agent(max_steps=200, verbose=False, recorder=recorder)
+        with open(path, "ab") as file:
+            file.write(EPISODE_HEADER.pack(0, 50, 4, 0) + bytes(20))
+
+        with TraceReader(path) as reader:
+            expect(len(reader) == len(played),
+                   f"{len(reader)} episodes read back, {len(played)} played")
+            for index, (episode, (world_seed, outcome, layout, codes, states)) in enumerate(
+                    zip(reader, played)):
+                where = f"episode {index}"
+                expect((episode.seed, episode.outcome, bytes(episode.layout)) ==
+                       (world_seed, outcome, layout), f"{where}: header or layout differs")
+                expect(list(episode.action_codes) == codes, f"{where}: actions differ")
+                for step in range(len(codes)):
+                    expect(episode.percept_codes[step] == states[step + 1][-1],
+                           f"{where} step {step}: percepts differ")
+                for step in sorted({0, len(codes) // 2, len(codes)}):
+                    expect(world_state(episode.world_at(step)) == states[step],
+                           f"{where}: world_at({step}) differs")
+    return len(played)
+
+
+def check_vecenv(grid_sizes=(2, 4, 7), count=300, steps=60, seed=0):
+    # VecWumpusWorld against one scalar WumpusWorld per index under the same
+    # random actions
+    from episode_trace import ACTIONS, encode_percepts
+    from vecenv import OUTCOMES, VecWumpusWorld
+    from wampusworld import ACTION_CODES, HEADINGS
+
+    for grid_size in grid_sizes:
+        env = VecWumpusWorld(count, grid_size=grid_size)
+        seeds = list(range(seed, seed + count))
+        env.reset(seeds)
+        worlds = [WumpusWorld(grid_size, 0.2, seed=s) for s in seeds]
+        rng = random.Random(grid_size)
+        for step in range(steps):
+            actions = [rng.choice(ACTIONS) for _ in range(count)]
+            percepts, moved, outcomes = env.step([ACTION_CODES[action] for action in actions])
+            for index, world in enumerate(worlds):
+                where = f"{grid_size}x{grid_size} world {index} step {step} ({actions[index]})"
+                result = world.execute_action(actions[index])
+                expect(bool(moved[index]) == bool(result), f"{where}: action result differs")
+                expect(percepts[index] == encode_percepts(world.percepts),
+                       f"{where}: percepts differ")
+                expect(OUTCOMES[outcomes[index]] == world.is_game_over(),
+                       f"{where}: outcome differs")
+                expect((env.x[index], env.y[index]) == world.agent_pos and
+                       HEADINGS[env.heading[index]] == world.agent_dir,
+                       f"{where}: position or heading differs")
+        expect(env.world(5).world == worlds[5].world, f"{grid_size}x{grid_size}: world() differs")
+        env.reset(indices=[0, 1], seeds=[seed + count, seed + count + 1])
+        expect(env.world(0).world == WumpusWorld(grid_size, 0.2, seed=seed + count).world,
+               f"{grid_size}x{grid_size}: partial reset differs")
+    return len(grid_sizes) * count
+
+
+def check_server(games=60, max_steps=300, seed=0):
+    # Plays games through AgentServer over TCP, several at once, next to a
+    # local Session for each: every observation must match byte for byte.
+    # Then the error statuses: bad creates and steps, unknown sessions,
+    # oversized requests, an agent that raises, and eviction when full.
+    import asyncio
+
+    from agent_server import (MAX_PAYLOAD, OP_CREATE, OP_STEP, STATUS_BAD_REQUEST,
+                              STATUS_FINISHED, STATUS_OK, STATUS_SERVER_ERROR,
+                              STATUS_UNKNOWN_SESSION, AgentClient, AgentServer, Session,
+                              _new_game)
+    from wampusworld import TURN_LEFT
+
+    kinds = ("logic", "bitboard", "dpll")
+    checked = 0
+
+    async def play(client, game):
+        nonlocal checked
+        kind = kinds[game % len(kinds)]
+        reference = Session(*_new_game(seed + game, 4, 0.2, kind))
+        status, session_id, observation = await client.create(seed + game, agent=kind)
+        where = f"game {game} ({kind})"
+        expect(status == STATUS_OK and observation == reference.observation(),
+               f"{where}: create gave status {status}")
+        for step in range(max_steps):
+            # Every fifth step is chosen by the client
+            action = TURN_LEFT if step % 5 == 4 else None
+            status, _, observation = await client.step(session_id, action)
+            reference.advance(action)
+            expect(status == STATUS_OK and observation == reference.observation(),
+                   f"{where} step {step}: status {status}, observation differs")
+            checked += 1
+            if reference.status != "continue":
+                status, _, observation = await client.step(session_id)
+                expect(status == STATUS_FINISHED and observation == reference.observation(),
+                       f"{where}: step after the end gave status {status}")
+                break
+        expect(await client.observe(session_id) ==
+               (STATUS_OK, session_id, reference.observation()),
+               f"{where}: observe differs")
+        expect((await client.close_session(session_id))[0] == STATUS_OK,
+               f"{where}: close failed")
+        expect((await client.observe(session_id))[0] == STATUS_UNKNOWN_SESSION,
+               f"{where}: session still there after close")
+
+    async def expect_status(request, expected, what):
+        nonlocal checked
+        status = (await request)[0]
+        expect(status == expected, f"{what}: status {status}, expected {expected}")
+        checked += 1
+
+    async def run():
+        server = AgentServer(max_sessions=games, workers=2, max_grid_size=64)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        clients = [await AgentClient.connect(port=port) for _ in range(games)]
+        try:
+            await asyncio.gather(*(play(client, game) for game, client in enumerate(clients)))
+
+            client = clients[0]
+            bad_requests = [
+                (client.create(grid_size=1), "1x1 world"),
+                (client.create(grid_size=65), "world over max_grid_size"),
+                (client.create(pit_prob=1.5), "pit probability 1.5"),
+                (client.request(OP_CREATE, 0, b"\0"), "short create"),
+            ]
+            status, session_id, _ = await client.create(seed)
+            bad_requests += [
+                (client.request(OP_STEP, session_id, b"\x09"), "unknown action code"),
+                (client.request(9, session_id), "unknown opcode"),
+            ]
+            for request, what in bad_requests:
+                await expect_status(request, STATUS_BAD_REQUEST, what)
+            await expect_status(client.step(session_id + 1000), STATUS_UNKNOWN_SESSION,
+                                "unknown session")
+
+            def fail():
+                raise RuntimeError("agent failed")
+
+            server.sessions[session_id].agent.decide_action = fail
+            await expect_status(client.step(session_id), STATUS_SERVER_ERROR, "agent raising")
+            await expect_status(client.observe(session_id), STATUS_OK,
+                                "observe after an agent error")
+
+            # Full: the least recently used session makes room
+            for _ in range(games):
+                status, _, _ = await client.create(seed)
+                expect(status == STATUS_OK, f"create when full: status {status}")
+            await expect_status(client.observe(session_id), STATUS_UNKNOWN_SESSION,
+                                "evicted session")
+            expect(server.evictions > 0, "no session was evicted")
+
+            # An oversized request is refused and the connection closed
+            client = clients[1]
+            status, _, _ = await client.request(OP_STEP, session_id, bytes(MAX_PAYLOAD + 1))
+            expect(status == STATUS_BAD_REQUEST, f"oversized request: status {status}")
+            expect(await client.reader.read() == b"", "connection left open after a bad header")
+        finally:
+            for client in clients:
+                await client.close()
+            await server.close()
+
+    asyncio.run(run())
+    return checked
+
+
+def play(world, agent, max_steps):
+    # (actions, outcome) of up to max_steps decide/execute steps
+    actions = []
+    for _ in range(max_steps):
+        action = agent.decide_action()
+        actions.append(action)
+        if action == EXIT:
+            return actions, "win"
+        agent.execute_action(action)
+        outcome = world.is_game_over()
+        if outcome != "continue":
+            return actions, outcome
+    return actions, "continue"
+
+
+def check_fork(grid_sizes=(4, 6), episodes=60, seed=0, max_steps=300):
+    # Plays part of an episode, then forks it: the rest must play out the
+    # same after restoring a snapshot (twice), in a clone, and without
+    # forking at all. Playing the clone must leave the original's knowledge
+    # and grid alone.
+    from episode_trace import encode_layout
+    from tournament import AGENTS
+    from wampusworld import KNOWLEDGE_SETS
+
+    checked = 0
+    for kind in ("logic", "bitboard", "dpll"):
+        for grid_size in grid_sizes:
+            for episode in range(episodes):
+                world = WumpusWorld(grid_size, 0.2, seed=seed + episode)
+                full = play(world, AGENTS[kind](world), max_steps)
+                for split in (0, 3, 8):
+                    where = f"{kind} {grid_size}x{grid_size} seed {seed + episode} step {split}"
+                    world = WumpusWorld(grid_size, 0.2, seed=seed + episode)
+                    agent = AGENTS[kind](world)
+                    start, outcome = play(world, agent, split)
+                    if outcome != "continue":
+                        continue
+                    world_snapshot, agent_snapshot = world.snapshot(), agent.snapshot()
+                    knowledge = {name: set(getattr(agent, name)) for name in KNOWLEDGE_SETS}
+                    layout = encode_layout(world)
+                    clone = agent.clone()
+                    expect(clone.world is not world, f"{where}: clone shares the world")
+                    cloned = play(clone.world, clone, max_steps - split)
+                    expect({name: set(getattr(agent, name)) for name in KNOWLEDGE_SETS} ==
+                           knowledge, f"{where}: playing the clone changed the original")
+                    expect(encode_layout(world) == layout and
+                           (world.agent_pos, world.heading) == world_snapshot[1:3],
+                           f"{where}: playing the clone changed the original world")
+                    rest = play(world, agent, max_steps - split)
+                    expect((start + rest[0], rest[1]) == full,
+                           f"{where}: the split episode differs from the full one")
+                    expect(cloned == rest, f"{where}: the clone played differently")
+                    for attempt in range(2):
+                        world.restore(world_snapshot)
+                        agent.restore(agent_snapshot)
+                        expect(encode_layout(world) == layout,
+                               f"{where}: restore did not bring the grid back")
+                        expect(play(world, agent, max_steps - split) == rest,
+                               f"{where}: replay {attempt + 1} after restore differs")
+                    checked += 1
+    return checked
+
+
+def check_corpus(grid_sizes=(4, 8), per_label=40, seed=0):
+    # Builds the suite twice: the files must be identical. Every entry must
+    # rebuild from its seed, hold its label when played again, and appear
+    # once; reopening the file for writing must not add its worlds again.
+    from corpus import (LABEL_MAX_STEPS, LABELS, CorpusReader, CorpusWriter, build_suite,
+                        gold_reachable)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"suite{index}.corpus") for index in range(2)]
+        for path in paths:
+            build_suite(path, grid_sizes, per_label, base_seed=seed)
+        with open(paths[0], "rb") as first, open(paths[1], "rb") as second:
+            expect(first.read() == second.read(), "rebuilding the suite gave a different file")
+
+        with CorpusReader(paths[0]) as reader:
+            entries = list(reader)
+            counts = Counter((entry.grid_size, entry.label) for entry in entries)
+            expect(counts == {(grid_size, label): per_label
+                              for grid_size in grid_sizes for label in LABELS},
+                   f"label counts {dict(counts)}")
+            layouts = set()
+            for index, entry in enumerate(entries):
+                where = f"entry {index} ({entry.grid_size}x{entry.grid_size} seed {entry.seed})"
+                world = entry.world()
+                expect(world.world == WumpusWorld(entry.grid_size, entry.pit_prob,
+                                                  seed=entry.seed).world,
+                       f"{where}: layout differs from its seed")
+                layouts.add(bytes(entry.layout))
+                reachable = gold_reachable(world.world)
+                expect(reachable == (entry.label != "unsolvable"),
+                       f"{where}: labelled {entry.label}, gold reachable: {reachable}")
+                if reachable:
+                    won = world.run_agent(max_steps=LABEL_MAX_STEPS, verbose=False) == "win"
+                    expect(won == (entry.label == "solvable"),
+                           f"{where}: labelled {entry.label}, reference agent won: {won}")
+            expect(len(layouts) == len(entries), "duplicate layouts in the suite")
+
+            with CorpusWriter(paths[0]) as writer:
+                expect(not any(writer.add(entry.world(), entry.label) for entry in entries),
+                       "a reopened writer added a world the file already holds")
+    return len(entries)
+
+
+def brute_force_win(world):
+    # Length of the shortest win found by breadth-first search over clones
+    # of the world itself, or None
+    actions = ("move_forward", "turn_left", "turn_right", "shoot", "grab_gold")
+
+    def key(world):
+        return (world.agent_pos, world.heading, world.has_arrow, world.wumpus_alive,
+                world.has_gold)
+
+    seen = {key(world)}
+    frontier = [world]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for current in frontier:
+            for action in actions:
+                successor = current.clone()
+                successor.execute_action(action)
+                outcome = successor.is_game_over()
+                if outcome == "win":
+                    return depth
+                if outcome == "lose" or key(successor) in seen:
+                    continue
+                seen.add(key(successor))
+                next_frontier.append(successor)
+        frontier = next_frontier
+    return None
+
+
+def check_oracle(grid_sizes=(2, 3, 4), worlds=300, seed=0):
+    # oracle.solve against brute force, and its plans replayed on the world
+    from corpus import gold_reachable
+    from oracle import solve
+
+    for grid_size in grid_sizes:
+        for index in range(worlds):
+            world = WumpusWorld(grid_size=grid_size, seed=seed + index, pit_prob=0.25)
+            where = f"{grid_size}x{grid_size} seed {seed + index}"
+            path = solve(world)
+            expected = brute_force_win(world)
+            expect((path is None and expected is None) or
+                   (path is not None and len(path) == expected),
+                   f"{where}: oracle gave {path}, brute force {expected} steps")
+            expect((path is not None) == gold_reachable(world.world),
+                   f"{where}: solvable but gold unreachable, or the reverse")
+            if path is not None:
+                replay = world.clone()
+                for action in path:
+                    expect(replay.is_game_over() == "continue", f"{where}: plan ends early")
+                    replay.execute_action(action)
+                expect(replay.is_game_over() == "win", f"{where}: plan does not win")
+    return len(grid_sizes) * worlds
+
+
+def check_stalls(grid_sizes=(4, 7), episodes=300, seed=0, max_steps=400):
+    # run_agent with and without stall detection on the same worlds. A game
+    # that ends without it must end the same way, at the same step, with it;
+    # "stuck" is only allowed where the undetected game runs out of steps.
+    from tournament import AGENTS
+
+    class ActionLog:
+        # A run_agent recorder that keeps the actions
+        def begin(self, world):
+            self.actions = []
+
+        def step(self, action, percepts):
+            self.actions.append(action)
+
+        def end(self, outcome):
+            pass
+
+    checked = 0
+    for kind in ("logic", "bitboard", "dpll"):
+        for grid_size in grid_sizes:
+            for episode in range(episodes):
+                where = f"{kind} {grid_size}x{grid_size} seed {seed + episode}"
+                results = []
+                for detect_stalls in (False, True):
+                    world = WumpusWorld(grid_size, 0.2, seed=seed + episode)
+                    log = ActionLog()
+                    outcome = world.run_agent(max_steps=max_steps, verbose=False,
+                                              agent_factory=AGENTS[kind], recorder=log,
+                                              detect_stalls=detect_stalls)
+                    results.append((outcome, world.steps_taken, log.actions))
+                (plain, plain_steps, plain_actions), (detected, steps, actions) = results
+                if plain != "continue":
+                    expect((detected, steps) == (plain, plain_steps),
+                           f"{where}: {detected} at step {steps} with stall detection, "
+                           f"{plain} at step {plain_steps} without")
+                else:
+                    expect(detected in ("stuck", "continue"),
+                           f"{where}: {detected} with stall detection, still going without")
+                expect(actions == plain_actions[:len(actions)],
+                       f"{where}: stall detection changed the actions taken")
+                checked += 1
+    return checked
+
+
+CHECKS = {
+    "bitboard": check_bitboard,
+    "search": check_search,
+    "plan-cache": check_plan_cache,
+    "dpll-solver": check_dpll_solver,
+    "dpll-soundness": check_dpll_soundness,
+    "trace": check_trace,
+    "vecenv": check_vecenv,
+    "server": check_server,
+    "fork": check_fork,
+    "corpus": check_corpus,
+    "oracle": check_oracle,
+    "stalls": check_stalls,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the regression checks")
+    parser.add_argument("checks", nargs="*", metavar="CHECK",
+                        help=f"checks to run, from {', '.join(CHECKS)} (default: all)")
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error(f"unknown check {name!r}")
+
+    failed = 0
+    for name in args.checks or CHECKS:
+        start = time.perf_counter()
+        try:
+            cases = CHECKS[name]()
+        except CheckFailed as error:
+            failed += 1
+            print(f"{name}: FAILED: {error}", flush=True)
+        else:
+            print(f"{name}: ok ({cases} cases, {time.perf_counter() - start:.1f}s)", flush=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import numpy as np
+
+from wampusworld import grid_topology
+
+# Configurations are enumerated in chunks of this many rows
+ENUMERATION_CHUNK = 1 << 14
+
+
+def _neighbours(cell, grid_size):
+    return grid_topology(grid_size).neighbours(*cell)
+
+
+def _adjacent_count(plane):
+    # Number of orthogonal neighbours set in a boolean grid
+    plane = plane.astype(np.int32)
+    out = np.zeros_like(plane)
+    out[1:, :] += plane[:-1, :]
+    out[:-1, :] += plane[1:, :]
+    out[:, 1:] += plane[:, :-1]
+    out[:, :-1] += plane[:, 1:]
+    return out
+
+
+def _components(constraints):
+    # Groups constraints (lists of cells) that share cells, using union-find
+    parent = {}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cells in constraints:
+        for cell in cells:
+            parent.setdefault(cell, cell)
+        root = find(cells[0])
+        for cell in cells[1:]:
+            parent[find(cell)] = root
+
+    groups = {}
+    for cells in constraints:
+        groups.setdefault(find(cells[0]), []).append(cells)
+    return list(groups.values())
+
+
+class FrontierRiskEstimator:
+    # Estimates, for every unvisited cell next to a visited one, the
+    # probability that it holds a pit or the live Wumpus, given what the
+    # agent perceived in the cells it visited. It relies only on those
+    # percepts, not on the agent's safe/unsafe sets. Pits are independent
+    # with the world's pit probability, the Wumpus is uniform over the
+    # cells consistent with every stench observation, and the two are
+    # treated as independent of each other.
+    #
+    # Pit constraints split into connected components. Components of up to
+    # max_enumerate cells are solved exactly by enumerating every
+    # configuration as a NumPy batch. Larger ones fall back to rejection
+    # sampling from the prior.
+    def __init__(self, max_enumerate=16, samples=4096, max_rounds=8, rng=None):
+        self.max_enumerate = max_enumerate
+        self.samples = samples
+        self.max_rounds = max_rounds
+        self.rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+    def frontier(self, agent):
+        n = agent.world.grid_size
+        cells = set()
+        for cell in agent.visited:
+            for neighbour in _neighbours(cell, n):
+                if neighbour not in agent.visited:
+                    cells.add(neighbour)
+        return cells
+
+    def pit_probabilities(self, agent, frontier):
+        n = agent.world.grid_size
+        prior = getattr(agent.world, "pit_prob", 0.2)
+        visited = agent.visited
+        breeze = agent.breeze_positions
+
+        # Visited cells and the neighbours of breeze-free cells hold no pit
+        clear = set(visited)
+        for cell in visited:
+            if cell not in breeze:
+                clear.update(_neighbours(cell, n))
+
+        constraints = []
+        for cell in breeze:
+            if cell in visited:
+                cells = [c for c in _neighbours(cell, n) if c not in clear]
+                if cells:
+                    constraints.append(cells)
+
+        probabilities = {cell: (0.0 if cell in clear else prior) for cell in frontier}
+        for component in _components(constraints):
+            cells = sorted({cell for constraint in component for cell in constraint})
+            index = {cell: i for i, cell in enumerate(cells)}
+            matrix = np.zeros((len(component), len(cells)), dtype=np.int32)
+            for row, constraint in enumerate(component):
+                matrix[row, [index[cell] for cell in constraint]] = 1
+            if len(cells) <= self.max_enumerate:
+                marginals = self._enumerate(matrix, prior)
+            else:
+                marginals = self._sample(matrix, prior)
+            for cell, probability in zip(cells, marginals):
+                probabilities[cell] = float(probability)
+        return probabilities
+
+    def _enumerate(self, matrix, prior):
+        k = matrix.shape[1]
+        totals = np.zeros(k)
+        norm = 0.0
+        bits = np.arange(k)
+        for start in range(0, 1 << k, ENUMERATION_CHUNK):
+            codes = np.arange(start, min(1 << k, start + ENUMERATION_CHUNK), dtype=np.int64)
+            configs = ((codes[:, None] >> bits) & 1).astype(np.int32)
+            consistent = ((configs @ matrix.T) > 0).all(axis=1)
+            pits = configs.sum(axis=1)
+            weights = np.where(consistent, prior ** pits * (1 - prior) ** (k - pits), 0.0)
+            norm += weights.sum()
+            totals += weights @ configs
+        return totals / norm if norm > 0 else np.full(k, prior)
+
+    def _sample(self, matrix, prior):
+        k = matrix.shape[1]
+        totals = np.zeros(k)
+        accepted = 0
+        for _ in range(self.max_rounds):
+            configs = (self.rng.random((self.samples, k)) < prior).astype(np.int32)
+            consistent = ((configs @ matrix.T) > 0).all(axis=1)
+            totals += configs[consistent].sum(axis=0)
+            accepted += int(consistent.sum())
+            if accepted >= self.samples:
+                break
+        if accepted:
+            return totals / accepted
+        # Too constrained for the prior to hit: spread one pit per constraint
+        per_cell = (matrix / matrix.sum(axis=1, keepdims=True)).max(axis=0)
+        return np.maximum(per_cell, prior)
+
+    def wumpus_probabilities(self, agent, frontier):
+        if not agent.world.wumpus_alive:
+            return dict.fromkeys(frontier, 0.0)
+        n = agent.world.grid_size
+        visited = np.zeros((n, n), dtype=bool)
+        stench = np.zeros((n, n), dtype=bool)
+        for x, y in agent.visited:
+            visited[x, y] = True
+        for x, y in agent.stench_positions:
+            stench[x, y] = True
+        stench &= visited
+
+        # The Wumpus is next to every stench cell and no stench-free cell
+        candidates = (~visited
+                      & (_adjacent_count(stench) == stench.sum())
+                      & (_adjacent_count(visited & ~stench) == 0))
+        count = candidates.sum()
+        if count == 0:
+            return dict.fromkeys(frontier, 0.0)
+        return {(x, y): (1.0 / count if candidates[x, y] else 0.0) for x, y in frontier}
+
+    def risks(self, agent):
+        frontier = self.frontier(agent)
+        pits = self.pit_probabilities(agent, frontier)
+        wumpus = self.wumpus_probabilities(agent, frontier)
+        return {cell: 1.0 - (1.0 - pits[cell]) * (1.0 - wumpus[cell]) for cell in frontier}
+
+    def safest_cell(self, agent):
+        # Least risky frontier cell, the nearest one on ties; None if every
+        # frontier cell is certain death
+        x, y = agent.world.agent_pos
+        best = None
+        for cell, risk in self.risks(agent).items():
+            if risk >= 1.0:
+                continue
+            key = (round(risk, 9), abs(cell[0] - x) + abs(cell[1] - y), cell)
+            if best is None or key < best:
+                best = key
+        return best[2] if best is not None else None
@@ -0,0 +1,231 @@
+import argparse
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from bitboard import BitboardAgent
+from corpus import LABELS, CorpusReader
+from episode_trace import TraceWriter
+from inference import PropositionalInference
+from profiling import Profiler
+from wampusworld import LogicAgent, WumpusWorld
+
+# run_agent returns "continue" when it runs out of steps or time
+OUTCOMES = ("win", "lose", "timeout", "stuck")
+
+
+def dpll_agent(world):
+    return LogicAgent(world, inference=PropositionalInference())
+
+
+def risk_agent(world):
+    # risk needs NumPy; only load it when this agent is used
+    from risk import FrontierRiskEstimator
+    return LogicAgent(world, inference=PropositionalInference(),
+                      risk=FrontierRiskEstimator(rng=world.seed))
+
+
+AGENTS = {"logic": LogicAgent, "bitboard": BitboardAgent, "dpll": dpll_agent, "risk": risk_agent}
+
+
+class TournamentResult:
+    def __init__(self):
+        self.counts = Counter()
+        self.total_steps = Counter()
+        self.step_histograms = {outcome: Counter() for outcome in OUTCOMES}
+        self.plan_cache = Counter()
+        # Phase latency histograms, when the tournament is profiled
+        self.profile = None
+
+    def add(self, outcome, steps, plan_cache=None):
+        if plan_cache:
+            self.plan_cache.update(plan_cache)
+        self.counts[outcome] += 1
+        self.total_steps[outcome] += steps
+        self.step_histograms[outcome][steps] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total_steps.update(other.total_steps)
+        self.plan_cache.update(other.plan_cache)
+        if other.profile is not None:
+            self.profile = (self.profile or Profiler()).merge(other.profile)
+        for outcome, histogram in other.step_histograms.items():
+            self.step_histograms.setdefault(outcome, Counter()).update(histogram)
+        return self
+
+    @property
+    def episodes(self):
+        return sum(self.counts.values())
+
+    def rate(self, outcome):
+        episodes = self.episodes
+        return self.counts[outcome] / episodes if episodes else 0.0
+
+    def mean_steps(self, outcome=None):
+        if outcome is None:
+            count = self.episodes
+            steps = sum(self.total_steps.values())
+        else:
+            count = self.counts[outcome]
+            steps = self.total_steps[outcome]
+        return steps / count if count else 0.0
+
+    def summary(self):
+        return {
+            "episodes": self.episodes,
+            "rates": {outcome: self.rate(outcome) for outcome in self.step_histograms},
+            "counts": dict(self.counts),
+            "mean_steps": {outcome: self.mean_steps(outcome) for outcome in self.step_histograms},
+            "step_histograms": {outcome: dict(sorted(histogram.items()))
+                                for outcome, histogram in self.step_histograms.items()},
+            "plan_cache": {name: self.plan_cache[name] for name in ("hits", "misses", "evictions")},
+        }
+
+
+def play_episode(seed, max_steps=1000, agent_factory=None, grid_size=4, pit_prob=0.2,
+                 time_budget=None, recorder=None, profiler=None, world=None):
+    # Each episode owns its seed so results do not depend on how the
+    # episodes were split between workers. A given world (e.g. from a
+    # corpus) is played instead of the seeded one.
+    if world is None:
+        world = WumpusWorld(grid_size=grid_size, pit_prob=pit_prob, seed=seed)
+    status = world.run_agent(max_steps=max_steps, verbose=False, agent_factory=agent_factory,
+                             recorder=recorder, profiler=profiler, time_budget=time_budget)
+    if status == "continue":
+        status = "timeout"
+    plan_cache = getattr(world.agent, "plan_cache", None)
+    stats = plan_cache.stats() if plan_cache is not None else None
+    return status, world.steps_taken, stats
+
+
+def _play_chunk(args):
+    # seeds is a range of seeds, or a (corpus path, indices) pair
+    seeds, episode_args, trace_dir, profile = args
+    result = TournamentResult()
+    if profile:
+        result.profile = Profiler()
+    recorder = None
+    if trace_dir is not None:
+        # One file per worker process, so appends never interleave
+        recorder = TraceWriter(os.path.join(trace_dir, f"episodes-{os.getpid()}.trace"))
+    reader = None
+    try:
+        if isinstance(seeds, range):
+            for seed in seeds:
+                result.add(*play_episode(seed, *episode_args, recorder=recorder,
+                                         profiler=result.profile))
+        else:
+            path, indices = seeds
+            reader = CorpusReader(path)
+            for index in indices:
+                entry = reader[index]
+                result.add(*play_episode(entry.seed, *episode_args, recorder=recorder,
+                                         profiler=result.profile, world=entry.world()))
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if reader is not None:
+            reader.close()
+    return result
+
+
+def _chunks(episodes, base_seed, chunk_size, episode_args, trace_dir, profile, corpus=None):
+    for start in range(0, episodes, chunk_size):
+        stop = min(start + chunk_size, episodes)
+        if corpus is None:
+            seeds = range(base_seed + start, base_seed + stop)
+        else:
+            seeds = (corpus[0], corpus[1][start:stop])
+        yield seeds, episode_args, trace_dir, profile
+
+
+def run_tournament(episodes, workers=None, base_seed=0, max_steps=1000,
+                   agent_factory=None, chunk_size=None, grid_size=4, pit_prob=0.2,
+                   trace_dir=None, profile=False, corpus=None, label=None, time_budget=None):
+    # agent_factory must be picklable (a class or a module-level function)
+    # because it is shipped to the worker processes. With trace_dir set,
+    # every episode is recorded there (see episode_trace). With profile set,
+    # result.profile holds the phase latency histograms (see profiling).
+    # With a corpus path, its worlds (only those with the given label, if
+    # any) are played instead of seeded ones, at most `episodes` of them.
+    # time_budget caps the seconds spent on each episode.
+    if corpus is not None:
+        with CorpusReader(corpus) as reader:
+            indices = reader.select(label)
+        episodes = min(episodes, len(indices))
+        corpus = (corpus, indices)
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # Enough chunks to balance uneven episode lengths, few enough that
+        # the per-chunk IPC stays negligible
+        chunk_size = max(1, min(1000, episodes // (workers * 8)))
+
+    episode_args = (max_steps, agent_factory, grid_size, pit_prob, time_budget)
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+    chunks = _chunks(episodes, base_seed, chunk_size, episode_args, trace_dir, profile, corpus)
+    result = TournamentResult()
+    if workers == 1:
+        for chunk in chunks:
+            result.merge(_play_chunk(chunk))
+        return result
+
+    with Pool(workers) as pool:
+        for partial in pool.imap_unordered(_play_chunk, chunks):
+            result.merge(partial)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless Wumpus World episodes")
+    parser.add_argument("-n", "--episodes", type=int, default=10000)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="end an episode as a timeout after this many seconds")
+    parser.add_argument("--agent", choices=sorted(AGENTS), default="logic")
+    parser.add_argument("--grid-size", type=int, default=4)
+    parser.add_argument("--pit-prob", type=float, default=0.2)
+    parser.add_argument("--trace-dir", help="record every episode to trace files in this directory")
+    parser.add_argument("--corpus", help="play the worlds in this corpus file instead of seeded ones")
+    parser.add_argument("--label", choices=LABELS, help="only play corpus worlds with this label")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write phase latency histograms here (Prometheus text if PATH ends in .prom, else JSON)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = run_tournament(args.episodes, workers=args.workers,
+                            base_seed=args.seed, max_steps=args.max_steps,
+                            agent_factory=AGENTS[args.agent],
+                            grid_size=args.grid_size, pit_prob=args.pit_prob,
+                            trace_dir=args.trace_dir, profile=args.profile is not None,
+                            corpus=args.corpus, label=args.label, time_budget=args.time_budget)
+    elapsed = time.perf_counter() - start
+
+    print(f"Episodes: {result.episodes} in {elapsed:.2f}s "
+          f"({result.episodes / elapsed:.0f} episodes/s)")
+    for outcome in OUTCOMES:
+        print(f"{outcome:>8}: {result.rate(outcome):7.2%}  "
+              f"mean steps {result.mean_steps(outcome):.1f}")
+    cache = result.plan_cache
+    lookups = cache["hits"] + cache["misses"]
+    if lookups:
+        print(f"Plan cache: {cache['hits']} hits / {lookups} lookups "
+              f"({cache['hits'] / lookups:.1%}), {cache['evictions']} evictions")
+    if result.profile is not None:
+        for name, histogram in sorted(result.profile.histograms.items()):
+            if histogram.unit == "seconds":
+                print(f"{name:>18}: p50 {histogram.quantile(0.5) * 1e6:8.1f}us  "
+                      f"p99 {histogram.quantile(0.99) * 1e6:8.1f}us  max {histogram.max * 1e6:8.1f}us")
+        with open(args.profile, "w") as f:
+            if args.profile.endswith(".prom"):
+                f.write(result.profile.to_prometheus())
+            else:
+                f.write(result.profile.to_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import numpy as np
+
+from episode_trace import PERCEPTS, OUTCOMES, encode_layout
+from wampusworld import (BREEZE_BIT, BUMP_BIT, EXIT, GLITTER_BIT, GRAB_GOLD, HEADING_DELTAS,
+                         MOVE_FORWARD, RIGHT, SCREAM_BIT, SHOOT, STENCH_BIT, TURN_LEFT, TURN_RIGHT,
+                         WAIT, WumpusWorld)
+from worldgen import PIT, WUMPUS, GOLD, STENCH, BREEZE, WorldBatch
+
+# Percepts are packed one byte per world in the world's own percept bits
+# (bit i set for PERCEPTS[i], as in episode traces)
+CONTINUE, WIN, LOSE = (OUTCOMES.index(outcome) for outcome in ("continue", "win", "lose"))
+
+_DELTAS = np.array(HEADING_DELTAS, dtype=np.int64)
+
+
+def unpack_percepts(packed):
+    # (K,) packed bytes -> (K, len(PERCEPTS)) booleans, columns in PERCEPTS order
+    packed = np.asarray(packed, dtype=np.uint8)
+    return (packed[:, None] >> np.arange(len(PERCEPTS), dtype=np.uint8)) & 1 != 0
+
+
+class VecWumpusWorld:
+    # K worlds of the same size stepped in lockstep. State lives in arrays
+    # indexed by world: the worldgen cell bytes plus position, heading (an
+    # index into HEADINGS), arrow/gold/Wumpus flags and the packed percepts.
+    # Actions are ACTIONS codes and behave exactly like
+    # WumpusWorld.execute_action, including which percepts are refreshed and
+    # which are only patched (bump, scream, glitter after a grab).
+    def __init__(self, count, grid_size=4, pit_prob=0.2):
+        self.count = count
+        self.grid_size = grid_size
+        self.pit_prob = pit_prob
+        self.cells = np.zeros((count, grid_size, grid_size), dtype=np.uint8)
+        self.x = np.zeros(count, dtype=np.int64)
+        self.y = np.zeros(count, dtype=np.int64)
+        self.heading = np.full(count, RIGHT, dtype=np.int64)
+        self.has_gold = np.zeros(count, dtype=bool)
+        self.has_arrow = np.ones(count, dtype=bool)
+        self.wumpus_alive = np.ones(count, dtype=bool)
+        self.percepts = np.zeros(count, dtype=np.uint8)
+        self.seeds = [None] * count
+        self._all = np.arange(count)
+
+    def __len__(self):
+        return self.count
+
+    def reset(self, seeds=None, batch=None, indices=None):
+        # Starts new episodes in the worlds at indices (all by default).
+        # seeds gives the same layouts as WumpusWorld(seed=...), so results
+        # line up with the scalar tournament; batch takes a worldgen
+        # WorldBatch instead. Returns the packed percepts of every world.
+        indices = self._all if indices is None else np.asarray(indices, dtype=np.int64)
+        if batch is not None:
+            cells = batch.cells
+            # Batch worlds were not made from a seed
+            seeds = [None] * len(indices)
+        else:
+            if seeds is None:
+                seeds = [None] * len(indices)
+            layouts = [np.frombuffer(encode_layout(WumpusWorld(self.grid_size, self.pit_prob, seed=seed)),
+                                     dtype=np.uint8)
+                       for seed in seeds]
+            cells = WorldBatch.from_layout(
+                np.stack(layouts).reshape(len(layouts), self.grid_size, self.grid_size)).cells
+        if len(cells) != len(indices):
+            raise ValueError(f"got {len(cells)} worlds for {len(indices)} indices")
+
+        for index, seed in zip(indices.tolist(), seeds):
+            self.seeds[index] = seed
+        self.cells[indices] = cells
+        self.x[indices] = 0
+        self.y[indices] = 0
+        self.heading[indices] = RIGHT
+        self.has_gold[indices] = False
+        self.has_arrow[indices] = True
+        self.wumpus_alive[indices] = True
+        self.percepts[indices] = self.get_percepts(indices)
+        return self.percepts.copy()
+
+    def get_percepts(self, indices=None):
+        # Fresh percepts at the current positions, bump and scream cleared
+        indices = self._all if indices is None else indices
+        cell = self.cells[indices, self.x[indices], self.y[indices]]
+        percepts = np.where((cell & STENCH != 0) & self.wumpus_alive[indices], STENCH_BIT, 0)
+        percepts |= np.where(cell & BREEZE != 0, BREEZE_BIT, 0)
+        percepts |= np.where(cell & GOLD != 0, GLITTER_BIT, 0)
+        return percepts.astype(np.uint8)
+
+    def move_forward(self, indices):
+        nx = self.x[indices] + _DELTAS[self.heading[indices], 0]
+        ny = self.y[indices] + _DELTAS[self.heading[indices], 1]
+        inside = (nx >= 0) & (nx < self.grid_size) & (ny >= 0) & (ny < self.grid_size)
+        moved = indices[inside]
+        self.x[moved] = nx[inside]
+        self.y[moved] = ny[inside]
+        self.percepts[moved] = self.get_percepts(moved)
+        self.percepts[indices[~inside]] |= BUMP_BIT
+        return inside
+
+    def turn_left(self, indices):
+        self.heading[indices] = (self.heading[indices] - 1) % 4
+        self.percepts[indices] = self.get_percepts(indices)
+
+    def turn_right(self, indices):
+        self.heading[indices] = (self.heading[indices] + 1) % 4
+        self.percepts[indices] = self.get_percepts(indices)
+
+    def shoot_arrow(self, indices):
+        armed = self.has_arrow[indices]
+        indices = indices[armed]
+        self.has_arrow[indices] = False
+
+        # The arrow flies along the agent's row or column, away from it
+        x, y, heading = self.x[indices], self.y[indices], self.heading[indices]
+        dx, dy = _DELTAS[heading, 0], _DELTAS[heading, 1]
+        vertical = dx != 0
+        wumpus = (self.cells[indices] & WUMPUS) != 0
+        line = np.where(vertical[:, None], wumpus[np.arange(len(indices)), :, y],
+                        wumpus[np.arange(len(indices)), x, :])
+        origin = np.where(vertical, x, y)
+        step = np.where(vertical, dx, dy)
+        offset = (np.arange(self.grid_size) - origin[:, None]) * step[:, None]
+        hit = (line & (offset > 0)).any(axis=1)
+
+        killed = indices[hit]
+        self.wumpus_alive[killed] = False
+        self.percepts[killed] |= SCREAM_BIT
+        result = np.zeros(len(armed), dtype=bool)
+        result[np.flatnonzero(armed)[hit]] = True
+        return result
+
+    def grab_gold(self, indices):
+        x, y = self.x[indices], self.y[indices]
+        found = self.cells[indices, x, y] & GOLD != 0
+        grabbed = indices[found]
+        self.has_gold[grabbed] = True
+        self.cells[grabbed, x[found], y[found]] &= ~np.uint8(GOLD)
+        self.percepts[grabbed] &= ~np.uint8(GLITTER_BIT)
+        return found
+
+    def step(self, actions):
+        # actions: one ACTIONS code per world. Returns the packed percepts,
+        # whether each action succeeded (as execute_action reports it) and
+        # the is_game_over status as OUTCOMES codes.
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.shape != (self.count,):
+            raise ValueError(f"expected {self.count} actions, got shape {actions.shape}")
+        success = np.zeros(self.count, dtype=bool)
+        for code, method in ((MOVE_FORWARD, self.move_forward), (SHOOT, self.shoot_arrow),
+                             (GRAB_GOLD, self.grab_gold)):
+            indices = np.flatnonzero(actions == code)
+            if len(indices):
+                success[indices] = method(indices)
+        for code in (TURN_LEFT, TURN_RIGHT):
+            indices = np.flatnonzero(actions == code)
+            if len(indices):
+                (self.turn_left if code == TURN_LEFT else self.turn_right)(indices)
+        success |= (actions == TURN_LEFT) | (actions == TURN_RIGHT) | (actions == EXIT) | (actions == WAIT)
+        return self.percepts.copy(), success, self.is_game_over()
+
+    def is_game_over(self):
+        cell = self.cells[self._all, self.x, self.y]
+        dead = (cell & WUMPUS != 0) & self.wumpus_alive
+        lose = (cell & PIT != 0) | dead
+        win = self.has_gold & (self.x == 0) & (self.y == 0)
+        return np.where(lose, LOSE, np.where(win, WIN, CONTINUE)).astype(np.uint8)
+
+    def world(self, index):
+        # The index-th world as a WumpusWorld with the same state, e.g. to
+        # hand it to a LogicAgent
+        world = WorldBatch(self.cells[index:index + 1]).to_world(0)
+        world.pit_prob = self.pit_prob
+        world.seed = self.seeds[index]
+        world.agent_pos = (int(self.x[index]), int(self.y[index]))
+        world.heading = int(self.heading[index])
+        world.has_gold = bool(self.has_gold[index])
+        world.has_arrow = bool(self.has_arrow[index])
+        world.wumpus_alive = bool(self.wumpus_alive[index])
+        world.percept_bits = int(self.percepts[index])
+        return world
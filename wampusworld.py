@@ -1,86 +1,435 @@
+import copy
+import heapq
+import itertools
+import os
 import random
-from collections import deque
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum, IntFlag
+from functools import lru_cache
+
+# The core API is integers: headings, actions and percept bits. The string
+# names below are only a compatibility layer on top of them.
+class Heading(IntEnum):
+    # Clockwise: turn_right adds one, turn_left subtracts one
+    UP = 0
+    RIGHT = 1
+    DOWN = 2
+    LEFT = 3
+
+class Action(IntEnum):
+    MOVE_FORWARD = 0
+    TURN_LEFT = 1
+    TURN_RIGHT = 2
+    SHOOT = 3
+    GRAB_GOLD = 4
+    EXIT = 5
+    WAIT = 6
+
+class Percept(IntFlag):
+    STENCH = 1
+    BREEZE = 2
+    GLITTER = 4
+    BUMP = 8
+    SCREAM = 16
+
+HEADINGS = ("up", "right", "down", "left")
+HEADING_INDEX = {heading: index for index, heading in enumerate(HEADINGS)}
+HEADING_DELTAS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+ACTION_NAMES = ("move_forward", "turn_left", "turn_right", "shoot", "grab_gold", "exit", "wait")
+ACTION_CODES = {name: code for code, name in enumerate(ACTION_NAMES)}
+PERCEPT_NAMES = ("stench", "breeze", "glitter", "bump", "scream")
+# Plain ints for the hot path: looking up an enum member costs several
+# times a global lookup, and IntFlag operators build new members
+MOVE_FORWARD, TURN_LEFT, TURN_RIGHT, SHOOT, GRAB_GOLD, EXIT, WAIT = (int(action) for action in Action)
+UP, RIGHT, DOWN, LEFT = (int(heading) for heading in Heading)
+STENCH_BIT, BREEZE_BIT, GLITTER_BIT, BUMP_BIT, SCREAM_BIT = (int(percept) for percept in Percept)
+PLAN_ACTIONS = (MOVE_FORWARD, TURN_LEFT, TURN_RIGHT)
+# LogicAgent attributes that hold sets of (x, y) cells
+KNOWLEDGE_SETS = ("visited", "safe", "unsafe", "stench_positions", "breeze_positions",
+                  "wumpus_positions", "pit_positions", "possible_wumpus", "possible_pits",
+                  "frontier")
+# The ones plans depend on, kept as KnowledgeSets
+VERSIONED_SETS = ("safe", "unsafe", "frontier")
+# Knowledge versions are drawn from one counter shared by every set, so a
+# version never names two different contents, even across clones and restores
+_knowledge_versions = itertools.count(1)
+
+def action_code(action):
+    # Code of an Action, a code or an action name
+    return ACTION_CODES[action] if isinstance(action, str) else action
+
+def action_name(action):
+    # Unknown codes (e.g. from a buggy agent) are shown as numbers
+    if isinstance(action, str):
+        return action
+    return ACTION_NAMES[action] if 0 <= action < len(ACTION_NAMES) else str(action)
+
+def percept_dict(bits):
+    return {name: bool(bits >> i & 1) for i, name in enumerate(PERCEPT_NAMES)}
+
+class PerceptView(dict):
+    # What world.percepts returns: a dict built from percept_bits on every
+    # access, so writing to it would change nothing. Writes raise instead.
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("world.percepts is a read-only copy of percept_bits; "
+                        "assign world.percepts or world.percept_bits instead")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    update = pop = popitem = clear = setdefault = _read_only
+
+def percept_bits(percepts):
+    bits = 0
+    for i, name in enumerate(PERCEPT_NAMES):
+        if percepts[name]:
+            bits |= 1 << i
+    return bits
+
+# Order in which neighbours are listed; the knowledge rules rely on it
+NEIGHBOUR_DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+# Above this size topology entries are rebuilt on every lookup: caching
+# millions of small tuples costs more in allocation and GC time than it saves
+TOPOLOGY_CACHE_LIMIT = 256
+
+class GridTopology:
+    # Neighbour, move and line-of-fire tables for a square grid, shared by
+    # the world, the agents and the planner. Cells are (x, y) or flat
+    # indices (x * size + y). Entries are filled the first time a cell is
+    # looked up, so large grids only pay for the cells actually reached.
+    # Other layouts (toroidal, hex) only need to override the _build_*
+    # methods and, for hex, the heading tables.
+    headings = HEADINGS
+    turn_left = tuple((heading - 1) % len(HEADINGS) for heading in range(len(HEADINGS)))
+    turn_right = tuple((heading + 1) % len(HEADINGS) for heading in range(len(HEADINGS)))
+    
+    def __init__(self, size):
+        self.size = size
+        self.cell_count = size * size
+        self.cached = size <= TOPOLOGY_CACHE_LIMIT
+        self._neighbours = {}
+        self._neighbour_cells = {}
+        self._forward = {}
+        self._rays = {}
+    
+    def contains(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+    
+    def neighbours(self, x, y):
+        # Orthogonal neighbours of (x, y) in NEIGHBOUR_DELTAS order
+        if not self.cached:
+            return self._build_neighbours(x, y)
+        cell = x * self.size + y
+        result = self._neighbours.get(cell)
+        if result is None:
+            result = self._neighbours[cell] = tuple(self._build_neighbours(x, y))
+        return result
+    
+    def neighbour_cells(self, cell):
+        # Same as neighbours, as flat indices
+        result = self._neighbour_cells.get(cell)
+        if result is None:
+            n = self.size
+            result = tuple([x * n + y for x, y in self.neighbours(*divmod(cell, n))])
+            if self.cached:
+                self._neighbour_cells[cell] = result
+        return result
+    
+    def forward(self, cell):
+        # Flat index of the cell ahead of `cell` for every heading, -1 where
+        # that would leave the grid
+        if not self.cached:
+            return self._build_forward(cell)
+        result = self._forward.get(cell)
+        if result is None:
+            result = self._forward[cell] = self._build_forward(cell)
+        return result
+    
+    def ahead(self, x, y, heading):
+        # The (x, y) cell one move away, None at the edge
+        cell = self.forward(x * self.size + y)[heading]
+        return divmod(cell, self.size) if cell >= 0 else None
+    
+    def ray(self, x, y, heading):
+        # Cells in the line of fire from (x, y), nearest first
+        key = (x * self.size + y) * 4 + heading
+        result = self._rays.get(key)
+        if result is None:
+            result = self._build_ray(x, y, heading)
+            if self.cached:
+                self._rays[key] = result
+        return result
+    
+    def _build_neighbours(self, x, y):
+        n = self.size
+        cells = []
+        for dx, dy in NEIGHBOUR_DELTAS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < n and 0 <= ny < n:
+                cells.append((nx, ny))
+        return cells
+    
+    def _build_forward(self, cell):
+        n = self.size
+        x, y = divmod(cell, n)
+        return tuple([(x + dx) * n + y + dy if 0 <= x + dx < n and 0 <= y + dy < n else -1
+                      for dx, dy in HEADING_DELTAS])
+    
+    def _build_ray(self, x, y, heading):
+        cells = []
+        position = self.ahead(x, y, heading)
+        while position is not None:
+            cells.append(position)
+            position = self.ahead(position[0], position[1], heading)
+        return tuple(cells)
+
+@lru_cache(maxsize=16)
+def grid_topology(size):
+    # One topology per grid size, shared by every world of that size
+    return GridTopology(size)
+
+def turn_aware_distance(x, y, heading, tx, ty):
+    # Lower bound on the actions needed to reach (tx, ty): one move per
+    # cell, plus the turns needed to face every direction still to travel
+    dx, dy = tx - x, ty - y
+    needed = []
+    if dx:
+        needed.append(2 if dx > 0 else 0)
+    if dy:
+        needed.append(1 if dy > 0 else 3)
+    if len(needed) == 2:
+        turns = 1 if heading in needed else 2
+    elif needed:
+        turns = (needed[0] - heading) & 3
+        turns = 1 if turns == 3 else turns
+    else:
+        turns = 0
+    return abs(dx) + abs(dy) + turns
+
+class PlanCache:
+    # LRU cache of planned paths and goal tables. Keys include the agent's
+    # knowledge version, so entries go stale as soon as safe/unsafe change and are
+    # then pushed out by newer ones.
+    _MISSING = object()
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, usable=None):
+        # Returns the cached entry (None if no path exists) or _MISSING. An
+        # entry usable(entry) rejects counts as a miss and is not returned.
+        path = self.entries.get(key, self._MISSING)
+        if path is not self._MISSING and usable is not None and not usable(path):
+            path = self._MISSING
+        if path is self._MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return path
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def put(self, key, path):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = path
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def reuse(self):
+        # The caller kept following a plan it had already; counted as a hit
+        self.hits += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self.entries)}
+
+class KnowledgeSet(set):
+    # A set of cells that takes a new version whenever a cell is added or
+    # removed. Copies keep the version, as they hold the same cells.
+    __slots__ = ("version",)
+
+    def __init__(self, cells=()):
+        super().__init__(cells)
+        self.version = next(_knowledge_versions)
+
+    def add(self, cell):
+        if cell not in self:
+            set.add(self, cell)
+            self.version = next(_knowledge_versions)
+
+    def discard(self, cell):
+        if cell in self:
+            set.discard(self, cell)
+            self.version = next(_knowledge_versions)
+
+    def remove(self, cell):
+        set.remove(self, cell)
+        self.version = next(_knowledge_versions)
+
+    def pop(self):
+        cell = set.pop(self)
+        self.version = next(_knowledge_versions)
+        return cell
+
+    def clear(self):
+        if self:
+            set.clear(self)
+            self.version = next(_knowledge_versions)
+
+    def _changed(self, size):
+        if len(self) != size:
+            self.version = next(_knowledge_versions)
+
+    def update(self, *others):
+        size = len(self)
+        set.update(self, *others)
+        self._changed(size)
+
+    def difference_update(self, *others):
+        size = len(self)
+        set.difference_update(self, *others)
+        self._changed(size)
+
+    def intersection_update(self, *others):
+        size = len(self)
+        set.intersection_update(self, *others)
+        self._changed(size)
+
+    def symmetric_difference_update(self, other):
+        set.symmetric_difference_update(self, other)
+        self.version = next(_knowledge_versions)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def copy(self):
+        other = KnowledgeSet(self)
+        other.version = self.version
+        return other
 
 class LogicAgent:
-    def __init__(self, world):
+    # Copied on snapshot/clone; every other attribute is shared or immutable
+    FORK_COPIED = KNOWLEDGE_SETS + ("path", "action_sequence")
+    FORK_SHARED = ("has_planned_path", "path_goal", "path_version", "gold_position",
+                   "exit_planned", "last_search")
+    
+    def __init__(self, world, plan_cache_size=256, inference=None, risk=None):
         self.world = world
+        # Optional inference backend (e.g. inference.PropositionalInference)
+        # used instead of the built-in rules below
+        self.inference = inference
+        # Optional risk estimator (e.g. risk.FrontierRiskEstimator) used to
+        # pick the least risky move when no safe one is left
+        self.risk = risk
         self.visited = set()
-        self.safe = set()
-        self.unsafe = set()
+        self.safe = KnowledgeSet()
+        self.unsafe = KnowledgeSet()
         self.stench_positions = set()
         self.breeze_positions = set()
         self.wumpus_positions = set()
         self.pit_positions = set()
         self.possible_wumpus = set()
         self.possible_pits = set()
+        # Safe cells not visited yet, kept up to date as knowledge changes
+        self.frontier = KnowledgeSet()
         self.path = []
         self.action_sequence = []
         self.has_planned_path = False
+        # (target, risky) the current path leads to, and the knowledge
+        # version it was last checked against
+        self.path_goal = (None, False)
+        self.path_version = None
         self.gold_position = None
         self.exit_planned = False
+        self.plan_cache = PlanCache(plan_cache_size)
+        # (nodes expanded, peak queue length) of the last search_path call
+        self.last_search = (0, 0)
         
         # Initially, the starting position is safe and visited
         self.visited.add((0, 0))
         self.safe.add((0, 0))
     
+    def mark_safe(self, pos):
+        self.safe.add(pos)
+        if pos not in self.visited:
+            self.frontier.add(pos)
+    
     def update_knowledge(self):
         x, y = self.world.agent_pos
-        percepts = self.world.percepts
+        percepts = self.world.percept_bits
+        
+        if self.inference is not None:
+            self.inference.update(self, (x, y), percepts)
+            return
+        self.apply_percepts(x, y, percepts)
+    
+    def apply_percepts(self, x, y, percepts):
+        # The built-in rules, for the percept bits felt at (x, y)
         
         # Current cell is safe (since we're in it)
         self.safe.add((x, y))
         self.visited.add((x, y))
+        self.frontier.discard((x, y))
         
         # If glitter is perceived, note gold position
-        if percepts["glitter"]:
+        if percepts & GLITTER_BIT:
             self.gold_position = (x, y)
         
         # If scream is heard, Wumpus is dead
-        if percepts["scream"]:
+        if percepts & SCREAM_BIT:
             self.wumpus_positions.clear()
             self.possible_wumpus.clear()
         
+        neighbours = self.world.topology.neighbours(x, y)
+        
         # Handle stench (possible Wumpus nearby)
-        if percepts["stench"]:
+        if percepts & STENCH_BIT:
             self.stench_positions.add((x, y))
             # Add adjacent unvisited cells as possible Wumpus locations
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.world.grid_size and 
-                    0 <= ny < self.world.grid_size and 
-                    (nx, ny) not in self.visited and
-                    (nx, ny) not in self.safe):
-                    self.possible_wumpus.add((nx, ny))
+            for pos in neighbours:
+                if pos not in self.visited and pos not in self.safe:
+                    self.possible_wumpus.add(pos)
         else:
             # If no stench, adjacent cells cannot have Wumpus
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.world.grid_size and 0 <= ny < self.world.grid_size):
-                    if (nx, ny) in self.possible_wumpus:
-                        self.possible_wumpus.remove((nx, ny))
-                    self.safe.add((nx, ny))
+            for pos in neighbours:
+                self.possible_wumpus.discard(pos)
+                self.mark_safe(pos)
         
         # Handle breeze (possible pit nearby)
-        if percepts["breeze"]:
+        if percepts & BREEZE_BIT:
             self.breeze_positions.add((x, y))
             # Add adjacent unvisited cells as possible pit locations
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.world.grid_size and 
-                    0 <= ny < self.world.grid_size and 
-                    (nx, ny) not in self.visited and
-                    (nx, ny) not in self.safe):
-                    self.possible_pits.add((nx, ny))
+            for pos in neighbours:
+                if pos not in self.visited and pos not in self.safe:
+                    self.possible_pits.add(pos)
         else:
             # If no breeze, adjacent cells cannot have pits
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < self.world.grid_size and 0 <= ny < self.world.grid_size):
-                    if (nx, ny) in self.possible_pits:
-                        self.possible_pits.remove((nx, ny))
-                    self.safe.add((nx, ny))
+            for pos in neighbours:
+                self.possible_pits.discard(pos)
+                self.mark_safe(pos)
         
         # Deduce Wumpus position if possible
         if len(self.possible_wumpus) == 1:
@@ -93,84 +442,259 @@ class LogicAgent:
             if pos not in self.possible_wumpus:
                 self.unsafe.add(pos)
     
-    def plan_path_to_safe(self, target=None):
-        start = self.world.agent_pos
-        start_dir = self.world.agent_dir
+    def plan_path_to_safe(self, target=None, risky=False):
+        # With risky=True the final step may enter target even though it is
+        # not known to be safe. decide_action calls this again on every step
+        # of a plan, which keeps the rest of it while it still holds.
+        x, y = self.world.agent_pos
+        heading = self.world.heading
+        version = self.knowledge_version()
+        if target is None:
+            # Exploration plans also end on a frontier cell
+            version += (self.frontier.version,)
+        
+        if self.path and self.path_goal == (target, risky):
+            # Nothing the plan was made from has changed
+            if self.path_version == version:
+                self.plan_cache.reuse()
+                return True
+            # Knowledge changed, but not along the rest of the way
+            if self.path_open(x, y, heading, target, risky):
+                self.path_version = version
+                return True
         
         if target is None:
-            # Find nearest unvisited safe cell
-            unvisited_safe = [pos for pos in self.safe if pos not in self.visited]
-            if not unvisited_safe:
+            # Search towards every frontier cell at once; the first one
+            # reached is the nearest counting turns
+            if not self.frontier:
                 return False
-            target = unvisited_safe[0]
+            key = ((x, y), heading, version)
+            path = self.plan_cache.get(key)
+            if path is PlanCache._MISSING:
+                path = self.search_path((x, y), heading, self.frontier)
+                self.plan_cache.put(key, tuple(path) if path is not None else None)
+        else:
+            # The first query for a target is answered by A* from here and
+            # cached as (start state, path). Once the same target is asked
+            # for from another start, a goal table replaces it and answers
+            # from every start.
+            key = (target, version, risky)
+            state = (x * self.world.grid_size + y) * 4 + heading
+            entry = self.plan_cache.get(
+                key, lambda entry: isinstance(entry, dict) or entry[0] == state)
+            if entry is PlanCache._MISSING:
+                if key in self.plan_cache:
+                    entry = self.goal_table(target, risky)
+                else:
+                    path = self.search_path((x, y), heading, {target}, target, risky)
+                    entry = (state, tuple(path) if path is not None else None)
+                self.plan_cache.put(key, entry)
+            path = self.table_path(entry, state) if isinstance(entry, dict) else entry[1]
+        if path is None:
+            return False
+        self.path = list(path)
+        self.has_planned_path = True
+        self.path_goal = (target, risky)
+        self.path_version = version
+        return True
+    
+    def knowledge_version(self):
+        # Plans only depend on safe and unsafe (and, when exploring, on the
+        # frontier); their versions change whenever a cell is added or removed
+        return (self.safe.version, self.unsafe.version)
+    
+    def path_open(self, x, y, heading, target, risky):
+        # Whether the rest of self.path only enters cells search_path could
+        # use now, and still ends on target (or a frontier cell if None)
+        n = self.world.grid_size
+        forward = self.world.topology.forward
+        cell = x * n + y
+        for action in self.path:
+            if action == MOVE_FORWARD:
+                cell = forward(cell)[heading]
+                if cell < 0:
+                    return False
+                pos = divmod(cell, n)
+                if (pos not in self.safe or pos in self.unsafe) and not (risky and pos == target):
+                    return False
+            elif action == TURN_LEFT:
+                heading = GridTopology.turn_left[heading]
+            else:
+                heading = GridTopology.turn_right[heading]
+        pos = divmod(cell, n)
+        return pos == target if target is not None else pos in self.frontier
+    
+    def snapshot(self):
+        # Knowledge sets are small next to the grid, so they are copied
+        # (a table copy, no rehashing) rather than shared. The inference
+        # backend, if any, is deep-copied and dominates the cost.
+        state = {name: getattr(self, name).copy() for name in self.FORK_COPIED}
+        for name in self.FORK_SHARED:
+            state[name] = getattr(self, name)
+        if self.inference is not None:
+            state["inference"] = copy.deepcopy(self.inference)
+        return state
+    
+    def restore(self, snapshot):
+        # The world is restored separately (WumpusWorld.restore)
+        for name in self.FORK_COPIED:
+            setattr(self, name, snapshot[name].copy())
+        for name in self.FORK_SHARED:
+            setattr(self, name, snapshot[name])
+        if self.inference is not None:
+            self.inference = copy.deepcopy(snapshot["inference"])
+    
+    def clone(self, world=None):
+        # An independent agent playing `world` (by default a clone of this
+        # agent's world). The plan cache is shared: the copied sets keep
+        # their versions until they change, so a plan is only found again
+        # by an agent that knows the same.
+        cls = type(self)
+        clone = cls.__new__(cls)
+        # Functions set on the instance (e.g. profiler wrappers) are bound
+        # to this agent and are left behind
+        clone.__dict__ = {name: value for name, value in self.__dict__.items()
+                          if not callable(value)}
+        clone.__dict__.update(self.snapshot())
+        clone.world = world if world is not None else self.world.clone()
+        return clone
+    
+    def search_path(self, start, heading, targets, heuristic_target=None, enter_target=False):
+        # A* over integer states (cell * 4 + heading) through known safe
+        # cells. Every action costs 1. Only parent pointers are stored and
+        # the action list is rebuilt once the goal is reached. The
+        # heuristic is used for a single target; with several targets the
+        # search falls back to uniform cost. enter_target lets the last
+        # move go into heuristic_target whatever is known about it. The node
+        # count and queue peak are left in last_search.
+        n = self.world.grid_size
+        forward = self.world.topology.forward
+        turn_left = GridTopology.turn_left
+        turn_right = GridTopology.turn_right
+        safe = self.safe
+        unsafe = self.unsafe
+        if heuristic_target is not None:
+            tx, ty = heuristic_target
         
-        # BFS to find shortest path
-        queue = deque()
-        queue.append((start, [], start_dir))
-        visited = set()
-        visited.add((start, start_dir))
+        start_state = (start[0] * n + start[1]) * 4 + heading
+        parents = {start_state: -1}
+        cost = {start_state: 0}
+        queue = [(0, 0, start_state)]
+        expanded = 0
+        # The queue only shrinks on pops, so its peak is seen just before one
+        peak = 0
         
         while queue:
-            (x, y), path, current_dir = queue.popleft()
+            if len(queue) > peak:
+                peak = len(queue)
+            _, neg_g, state = heapq.heappop(queue)
+            g = -neg_g
+            if g > cost[state]:
+                continue  # Stale queue entry
+            expanded += 1
+            cell, heading = divmod(state, 4)
+            x, y = divmod(cell, n)
             
-            if (x, y) == target:
-                self.path = path
-                self.has_planned_path = True
-                return True
+            if (x, y) in targets:
+                self.last_search = (expanded, peak)
+                path = []
+                while parents[state] != -1:
+                    state, action = divmod(parents[state], 3)
+                    path.append(PLAN_ACTIONS[action])
+                path.reverse()
+                return path
             
-            # Try all possible moves from current position
-            for action in ["move_forward", "turn_left", "turn_right"]:
-                new_x, new_y = x, y
-                new_dir = current_dir
-                new_path = path.copy()
-                
-                if action == "move_forward":
-                    if new_dir == "up":
-                        new_x -= 1
-                    elif new_dir == "down":
-                        new_x += 1
-                    elif new_dir == "left":
-                        new_y -= 1
-                    elif new_dir == "right":
-                        new_y += 1
-                    
-                    # Check if new position is valid and safe
-                    if (0 <= new_x < self.world.grid_size and 
-                        0 <= new_y < self.world.grid_size and 
-                        (new_x, new_y) in self.safe and
-                        (new_x, new_y) not in self.unsafe):
-                        new_path.append("move_forward")
-                        if ((new_x, new_y), new_dir) not in visited:
-                            visited.add(((new_x, new_y), new_dir))
-                            queue.append(((new_x, new_y), new_path, new_dir))
-                else:
-                    # Turning changes direction but not position
-                    new_path.append(action)
-                    if action == "turn_left":
-                        dirs = ["up", "left", "down", "right"]
-                        idx = dirs.index(new_dir)
-                        new_dir = dirs[(idx + 1) % 4]
-                    else:  # turn_right
-                        dirs = ["up", "right", "down", "left"]
-                        idx = dirs.index(new_dir)
-                        new_dir = dirs[(idx + 1) % 4]
-                    
-                    if ((x, y), new_dir) not in visited:
-                        visited.add(((x, y), new_dir))
-                        queue.append(((x, y), new_path, new_dir))
+            successors = [(cell * 4 + turn_left[heading], 1, x, y),
+                          (cell * 4 + turn_right[heading], 2, x, y)]
+            next_cell = forward(cell)[heading]
+            if next_cell >= 0:
+                nx, ny = divmod(next_cell, n)
+                if (((nx, ny) in safe and (nx, ny) not in unsafe) or
+                    (enter_target and (nx, ny) == heuristic_target)):
+                    successors.append((next_cell * 4 + heading, 0, nx, ny))
+            
+            for next_state, action, sx, sy in successors:
+                if next_state in cost and cost[next_state] <= g + 1:
+                    continue
+                cost[next_state] = g + 1
+                parents[next_state] = state * 3 + action
+                h = 0
+                if heuristic_target is not None:
+                    h = turn_aware_distance(sx, sy, next_state & 3, tx, ty)
+                # Ties go to the deeper state, which reaches the goal sooner
+                heapq.heappush(queue, (g + 1 + h, -(g + 1), next_state))
         
-        return False
+        self.last_search = (expanded, peak)
+        return None
+    
+    def goal_table(self, target, enter_target=False):
+        # Breadth-first search backwards from target over integer states
+        # (cell * 4 + heading). Maps every state that can reach target to
+        # the first action of a shortest plan from it, and target's own
+        # states to -1. Moves follow the same rules as in search_path.
+        n = self.world.grid_size
+        topology = self.world.topology
+        turn_left = GridTopology.turn_left
+        turn_right = GridTopology.turn_right
+        safe = self.safe
+        unsafe = self.unsafe
+        
+        goal = target[0] * n + target[1]
+        table = {goal * 4 + heading: -1 for heading in range(4)}
+        queue = deque(table)
+        peak = len(queue)
+        while queue:
+            state = queue.popleft()
+            cell, heading = divmod(state, 4)
+            x, y = divmod(cell, n)
+            predecessors = [(cell * 4 + turn_right[heading], TURN_LEFT),
+                            (cell * 4 + turn_left[heading], TURN_RIGHT)]
+            if ((x, y) in safe and (x, y) not in unsafe) or (enter_target and cell == goal):
+                # Entering this cell is allowed, so so is the step into it
+                behind = topology.forward(cell)[(heading + 2) & 3]
+                if behind >= 0:
+                    predecessors.append((behind * 4 + heading, MOVE_FORWARD))
+            for previous, action in predecessors:
+                if previous not in table:
+                    table[previous] = action
+                    queue.append(previous)
+            if len(queue) > peak:
+                peak = len(queue)
+        
+        self.last_search = (len(table), peak)
+        return table
+    
+    def table_path(self, table, state):
+        # The plan a goal_table gives from state, or None if it has none
+        action = table.get(state)
+        if action is None:
+            return None
+        forward = self.world.topology.forward
+        turn_left = GridTopology.turn_left
+        turn_right = GridTopology.turn_right
+        path = []
+        while action >= 0:
+            path.append(action)
+            cell, heading = divmod(state, 4)
+            if action == MOVE_FORWARD:
+                state = forward(cell)[heading] * 4 + heading
+            elif action == TURN_LEFT:
+                state = cell * 4 + turn_left[heading]
+            else:
+                state = cell * 4 + turn_right[heading]
+            action = table[state]
+        return path
     
     def decide_action(self):
         self.update_knowledge()
         
         # If we have gold and are at start, exit to win
         if self.world.has_gold and self.world.agent_pos == (0, 0):
-            return "exit"
+            return EXIT
         
         # If we see glitter, grab the gold
-        if self.world.percepts["glitter"] and not self.world.has_gold:
-            return "grab_gold"
+        if self.world.percept_bits & GLITTER_BIT and not self.world.has_gold:
+            return GRAB_GOLD
         
         # If we know Wumpus position and have arrow, consider shooting
         if (self.world.has_arrow and 
@@ -182,13 +706,13 @@ class LogicAgent:
             
             # Check if Wumpus is in line of sight
             if (x == wx and 
-                ((self.world.agent_dir == "left" and y > wy) or 
-                 (self.world.agent_dir == "right" and y < wy))):
-                return "shoot"
+                ((self.world.heading == LEFT and y > wy) or 
+                 (self.world.heading == RIGHT and y < wy))):
+                return SHOOT
             elif (y == wy and 
-                  ((self.world.agent_dir == "up" and x > wx) or 
-                   (self.world.agent_dir == "down" and x < wx))):
-                return "shoot"
+                  ((self.world.heading == UP and x > wx) or 
+                   (self.world.heading == DOWN and x < wx))):
+                return SHOOT
         
         # If we have gold, plan path back to start
         if self.world.has_gold and not self.exit_planned:
@@ -196,80 +720,104 @@ class LogicAgent:
                 self.exit_planned = True
             else:
                 # If no path found, try to find one
-                return "wait"
+                return WAIT
         
-        # If we have a planned path, follow it
+        # If we have a planned path, follow it as long as it still holds,
+        # otherwise plan the way to the same goal again from here
         if self.has_planned_path and self.path:
-            action = self.path.pop(0)
-            return action
+            if self.plan_path_to_safe(*self.path_goal) and self.path:
+                return self.path.pop(0)
+            self.path = []
+            self.exit_planned = False
         
         # Otherwise, find a new safe place to explore
         if self.plan_path_to_safe():
             action = self.path.pop(0)
             return action
         
+        # No safe cell left: step into the least risky one
+        if self.risk is not None:
+            target = self.risk.safest_cell(self)
+            if target is not None and self.plan_path_to_safe(target, risky=True):
+                return self.path.pop(0)
+        
         # If no safe moves, try to shoot Wumpus if we have a good guess
         if (self.world.has_arrow and 
             self.world.wumpus_alive and 
             len(self.possible_wumpus) > 0):
-            # Try to face one of the possible Wumpus positions
-            for pos in self.possible_wumpus:
+            # Try to face one of the possible Wumpus positions, in cell order
+            # so set and bitboard knowledge pick the same one
+            for pos in sorted(self.possible_wumpus):
                 x, y = self.world.agent_pos
                 wx, wy = pos
-                if x == wx and y < wy and self.world.agent_dir != "right":
-                    return "turn_right"
-                elif x == wx and y > wy and self.world.agent_dir != "left":
-                    return "turn_left"
-                elif y == wy and x < wx and self.world.agent_dir != "down":
-                    return "turn_right" if self.world.agent_dir == "left" else "turn_left"
-                elif y == wy and x > wx and self.world.agent_dir != "up":
-                    return "turn_right" if self.world.agent_dir == "right" else "turn_left"
+                if x == wx and y < wy and self.world.heading != RIGHT:
+                    return TURN_RIGHT
+                elif x == wx and y > wy and self.world.heading != LEFT:
+                    return TURN_LEFT
+                elif y == wy and x < wx and self.world.heading != DOWN:
+                    return TURN_RIGHT if self.world.heading == LEFT else TURN_LEFT
+                elif y == wy and x > wx and self.world.heading != UP:
+                    return TURN_RIGHT if self.world.heading == RIGHT else TURN_LEFT
             
             # If facing a possible Wumpus, shoot
             for pos in self.possible_wumpus:
                 x, y = self.world.agent_pos
                 wx, wy = pos
                 if (x == wx and 
-                    ((self.world.agent_dir == "left" and y > wy) or 
-                     (self.world.agent_dir == "right" and y < wy))):
-                    return "shoot"
+                    ((self.world.heading == LEFT and y > wy) or 
+                     (self.world.heading == RIGHT and y < wy))):
+                    return SHOOT
                 elif (y == wy and 
-                      ((self.world.agent_dir == "up" and x > wx) or 
-                       (self.world.agent_dir == "down" and x < wx))):
-                    return "shoot"
+                      ((self.world.heading == UP and x > wx) or 
+                       (self.world.heading == DOWN and x < wx))):
+                    return SHOOT
         
         # If all else fails, wait (shouldn't happen in a solvable world)
-        return "wait"
+        return WAIT
+    
+    def stall_key(self):
+        # What decide_action depends on, summed up cheaply for run_agent's
+        # stall detection. Knowledge sets are represented by their sizes;
+        # apart from the possible_* sets they only grow during an episode
+        # (while the Wumpus lives), so equal sizes mean equal sets.
+        world = self.world
+        return (world.agent_pos, world.heading, world.percept_bits, world.has_gold,
+                world.has_arrow, world.wumpus_alive, self.knowledge_version(),
+                len(self.visited), len(self.wumpus_positions), len(self.possible_wumpus),
+                len(self.possible_pits), tuple(self.path), self.has_planned_path,
+                self.exit_planned)
     
     def execute_action(self, action):
-        if action == "move_forward":
-            return self.world.move_forward()
-        elif action == "turn_left":
-            self.world.turn_left()
-            return True
-        elif action == "turn_right":
-            self.world.turn_right()
-            return True
-        elif action == "shoot":
-            return self.world.shoot_arrow()
-        elif action == "grab_gold":
-            return self.world.grab_gold()
-        elif action == "exit":
-            return True
-        elif action == "wait":
-            return True
-        return False
+        return self.world.execute_action(action)
 
 class WumpusWorld:
-    def __init__(self):
-        self.grid_size = 4
+    def __init__(self, grid_size=4, pit_prob=0.2, seed=None, rng=None, world=None):
+        # An existing grid (e.g. from worldgen) can be passed in instead of
+        # generating a new one
+        if world is None and grid_size < 2:
+            # The Wumpus and the gold need two cells besides the start
+            raise ValueError("grid_size must be at least 2")
+        if not 0.0 <= pit_prob <= 1.0:
+            raise ValueError("pit_prob must be between 0 and 1")
+        self.grid_size = len(world) if world is not None else grid_size
+        self.topology = grid_topology(self.grid_size)
+        self.pit_prob = pit_prob
+        self.seed = seed
+        # Without a seed or rng the global random module is used
+        if rng is None:
+            rng = random.Random(seed) if seed is not None else random
+        self.rng = rng
         self.agent_pos = (0, 0)  # Starting at (1,1) in grid notation
-        self.agent_dir = "right"  # Initial direction
+        self.heading = RIGHT  # Initial direction
         self.has_gold = False
         self.has_arrow = True
         self.wumpus_alive = True
-        self.world = self.generate_world()
-        self.percepts = self.get_percepts()
+        self.world = world if world is not None else self.generate_world()
+        # Set once the grid may be shared with a snapshot or clone; writes
+        # then copy the row and cell they touch first
+        self._grid_shared = False
+        self.sense_map = self.compute_sense_map()
+        self.percept_bits = self.sense()
 
     def generate_world(self):
         # Initialize empty grid
@@ -279,7 +827,7 @@ class WumpusWorld:
 
         # Place Wumpus
         while True:
-            wumpus_pos = (random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1))
+            wumpus_pos = (self.rng.randint(0, self.grid_size - 1), self.rng.randint(0, self.grid_size - 1))
             if wumpus_pos not in occupied:
                 world[wumpus_pos[0]][wumpus_pos[1]]["wumpus"] = True
                 occupied.add(wumpus_pos)
@@ -287,80 +835,90 @@ class WumpusWorld:
 
         # Place Gold
         while True:
-            gold_pos = (random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1))
+            gold_pos = (self.rng.randint(0, self.grid_size - 1), self.rng.randint(0, self.grid_size - 1))
             if gold_pos not in occupied:
                 world[gold_pos[0]][gold_pos[1]]["gold"] = True
                 occupied.add(gold_pos)
                 break
 
-        # Place pits (20% chance per cell, avoid start and already occupied)
+        # Place pits (pit_prob chance per cell, avoid start and already occupied)
         for i in range(self.grid_size):
             for j in range(self.grid_size):
-                if (i, j) not in occupied and random.random() < 0.2:
+                if (i, j) not in occupied and self.rng.random() < self.pit_prob:
                     world[i][j]["pit"] = True
                     occupied.add((i, j))  # prevent placing multiple items in same cell
 
         return world
 
-    def get_percepts(self):
+    def compute_sense_map(self):
+        # Stench and breeze bits only depend on the layout, so they are
+        # computed once per world instead of on every percept
+        sense_map = [[0] * self.grid_size for _ in range(self.grid_size)]
+        neighbours = self.topology.neighbours
+        for i in range(self.grid_size):
+            for j in range(self.grid_size):
+                cell = self.world[i][j]
+                bits = (STENCH_BIT if cell["wumpus"] else 0) | (BREEZE_BIT if cell["pit"] else 0)
+                if not bits:
+                    continue
+                for nx, ny in neighbours(i, j):
+                    sense_map[nx][ny] |= bits
+        return sense_map
+
+    def sense(self):
+        # Percept bits felt in the agent's cell; bump and scream are added
+        # by the action that causes them
         x, y = self.agent_pos
-        cell = self.world[x][y]
-        percepts = {
-            "stench": False,
-            "breeze": False,
-            "glitter": False,
-            "bump": False,
-            "scream": False
-        }
-        
-        # Check adjacent cells for Wumpus (stench) and pits (breeze)
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.grid_size and 0 <= ny < self.grid_size:
-                if self.world[nx][ny]["wumpus"] and self.wumpus_alive:
-                    percepts["stench"] = True
-                if self.world[nx][ny]["pit"]:
-                    percepts["breeze"] = True
-        
-        # Current cell percepts
-        if cell["gold"]:
-            percepts["glitter"] = True
-        
-        return percepts
+        bits = self.sense_map[x][y]
+        if not self.wumpus_alive:
+            bits &= ~STENCH_BIT
+        if self.world[x][y]["gold"]:
+            bits |= GLITTER_BIT
+        return bits
+
+    # String API: the heading name and the percepts as a dict of booleans.
+    # The dict is built on every access; set percepts to replace the bits.
+    @property
+    def agent_dir(self):
+        return HEADINGS[self.heading]
+
+    @agent_dir.setter
+    def agent_dir(self, name):
+        self.heading = HEADING_INDEX[name]
+
+    @property
+    def percepts(self):
+        return PerceptView(percept_dict(self.percept_bits))
+
+    @percepts.setter
+    def percepts(self, percepts):
+        self.percept_bits = percept_bits(percepts)
+
+    def get_percepts(self):
+        return percept_dict(self.sense())
 
     def move_forward(self):
         x, y = self.agent_pos
-        new_x, new_y = x, y
-        
-        if self.agent_dir == "up":
-            new_x -= 1
-        elif self.agent_dir == "down":
-            new_x += 1
-        elif self.agent_dir == "left":
-            new_y -= 1
-        elif self.agent_dir == "right":
-            new_y += 1
+        new_pos = self.topology.ahead(x, y, self.heading)
         
         # Check if move is valid
-        if 0 <= new_x < self.grid_size and 0 <= new_y < self.grid_size:
-            self.agent_pos = (new_x, new_y)
-            self.percepts = self.get_percepts()
+        if new_pos is not None:
+            self.agent_pos = new_pos
+            self.percept_bits = self.sense()
             return True
         else:
-            self.percepts["bump"] = True
+            self.percept_bits |= BUMP_BIT
             return False
 
     def turn_left(self):
-        dirs = ["up", "left", "down", "right"]
-        idx = dirs.index(self.agent_dir)
-        self.agent_dir = dirs[(idx + 1) % 4]
-        self.percepts = self.get_percepts()
+        self.heading = self.topology.turn_left[self.heading]
+        self.percept_bits = self.sense()
+        return True
 
     def turn_right(self):
-        dirs = ["up", "right", "down", "left"]
-        idx = dirs.index(self.agent_dir)
-        self.agent_dir = dirs[(idx + 1) % 4]
-        self.percepts = self.get_percepts()
+        self.heading = self.topology.turn_right[self.heading]
+        self.percept_bits = self.sense()
+        return True
 
     def shoot_arrow(self):
         if not self.has_arrow:
@@ -371,30 +929,14 @@ class WumpusWorld:
         wumpus_killed = False
         
         # Arrow travels in a straight line in the current direction
-        if self.agent_dir == "up":
-            for i in range(x - 1, -1, -1):
-                if self.world[i][y]["wumpus"]:
-                    wumpus_killed = True
-                    break
-        elif self.agent_dir == "down":
-            for i in range(x + 1, self.grid_size):
-                if self.world[i][y]["wumpus"]:
-                    wumpus_killed = True
-                    break
-        elif self.agent_dir == "left":
-            for j in range(y - 1, -1, -1):
-                if self.world[x][j]["wumpus"]:
-                    wumpus_killed = True
-                    break
-        elif self.agent_dir == "right":
-            for j in range(y + 1, self.grid_size):
-                if self.world[x][j]["wumpus"]:
-                    wumpus_killed = True
-                    break
+        for i, j in self.topology.ray(x, y, self.heading):
+            if self.world[i][j]["wumpus"]:
+                wumpus_killed = True
+                break
         
         if wumpus_killed:
             self.wumpus_alive = False
-            self.percepts["scream"] = True
+            self.percept_bits |= SCREAM_BIT
             return True
         return False
 
@@ -402,11 +944,55 @@ class WumpusWorld:
         x, y = self.agent_pos
         if self.world[x][y]["gold"]:
             self.has_gold = True
-            self.world[x][y]["gold"] = False
-            self.percepts["glitter"] = False
+            self.set_cell(x, y, "gold", False)
+            self.percept_bits &= ~GLITTER_BIT
             return True
         return False
 
+    def set_cell(self, x, y, name, value):
+        if self._grid_shared:
+            self.world = list(self.world)
+            self.world[x] = list(self.world[x])
+            self.world[x][y] = dict(self.world[x][y])
+        self.world[x][y][name] = value
+
+    def snapshot(self):
+        # Everything an action can change. The grid is shared with the
+        # snapshot and copied on write; the percept maps never change.
+        self._grid_shared = True
+        return (self.world, self.agent_pos, self.heading, self.has_gold, self.has_arrow,
+                self.wumpus_alive, self.percept_bits)
+
+    def restore(self, snapshot):
+        (self.world, self.agent_pos, self.heading, self.has_gold, self.has_arrow,
+         self.wumpus_alive, self.percept_bits) = snapshot
+        self._grid_shared = True
+
+    def clone(self):
+        cls = type(self)
+        clone = cls.__new__(cls)
+        # Functions set on the instance and the agent playing this world
+        # stay behind
+        clone.__dict__ = {name: value for name, value in self.__dict__.items()
+                          if not callable(value) and name != "agent"}
+        clone.restore(self.snapshot())
+        return clone
+
+    def _no_op(self):
+        return True
+
+    # Indexed by action code; exit and wait change nothing
+    ACTION_TABLE = (move_forward, turn_left, turn_right, shoot_arrow, grab_gold, _no_op, _no_op)
+
+    def execute_action(self, action):
+        # action is an Action, its code or (the string API) its name;
+        # anything else fails
+        if not isinstance(action, int):
+            action = ACTION_CODES.get(action, -1)
+        if not 0 <= action < len(self.ACTION_TABLE):
+            return False
+        return self.ACTION_TABLE[action](self)
+
     def is_game_over(self):
         x, y = self.agent_pos
         cell = self.world[x][y]
@@ -416,113 +1002,209 @@ class WumpusWorld:
             return "win"
         return "continue"
 
-    def run_agent(self, max_steps=1000, visualize=False):
-        agent = LogicAgent(self)
+    def run_agent(self, max_steps=1000, visualize=False, verbose=True, agent_factory=None,
+                  recorder=None, visualizer=None, profiler=None, time_budget=None,
+                  detect_stalls=True):
+        # recorder (e.g. episode_trace.TraceWriter) is told about the world,
+        # every action and the outcome. visualizer overrides the default
+        # WumpusVisualizer created for visualize=True (e.g. one writing
+        # frames to disk). profiler (profiling.Profiler) times every step
+        # and the agent's phases.
+        #
+        # The episode ends with "continue" after max_steps steps or, with a
+        # time_budget, once that many seconds have passed. With
+        # detect_stalls, agents that have a stall_key method are stopped
+        # with "stuck" as soon as a key repeats: the agent is back in a
+        # state it has already acted from, e.g. waiting forever or turning
+        # in circles.
+        agent = agent_factory(self) if agent_factory is not None else LogicAgent(self)
+        self.agent = agent
+        if profiler is not None:
+            profiler.instrument(agent)
         steps = 0
+        self.steps_taken = 0
+        if recorder is not None:
+            recorder.begin(self)
         
-        if visualize:
+        vis = visualizer
+        if visualize and vis is None:
             vis = WumpusVisualizer(self)
+        if vis is not None:
             vis.draw_world()
         
+        seen_states = set() if detect_stalls and hasattr(agent, "stall_key") else None
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        status = "continue"
         while steps < max_steps:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if seen_states is not None:
+                state = agent.stall_key()
+                if state in seen_states:
+                    status = "stuck"
+                    break
+                seen_states.add(state)
             steps += 1
+            self.steps_taken = steps
+            if profiler is not None:
+                step_start = time.perf_counter()
             action = agent.decide_action()
             
-            if action == "exit":
-                print("Agent exited with gold! Victory!")
-                if visualize:
+            if action == EXIT or action == "exit":
+                if profiler is not None:
+                    profiler.observe("step", time.perf_counter() - step_start)
+                if verbose:
+                    print("Agent exited with gold! Victory!")
+                if recorder is not None:
+                    recorder.step(action, self.percept_bits)
+                    recorder.end("win")
+                if vis is not None:
                     vis.draw_world()
-                    plt.show(block=True)
+                    vis.show()
                 return "win"
             
             success = agent.execute_action(action)
+            if profiler is not None:
+                profiler.observe("step", time.perf_counter() - step_start)
+            if recorder is not None:
+                recorder.step(action, self.percept_bits)
             
-            if not success:
-                print("Action failed:", action)
+            if not success and verbose:
+                print("Action failed:", action_name(action))
             
             # Check game status
             status = self.is_game_over()
             if status != "continue":
-                if status == "win":
-                    print("Agent won!")
-                else:
-                    print("Agent lost!")
-                if visualize:
+                if verbose:
+                    print("Agent won!" if status == "win" else "Agent lost!")
+                if recorder is not None:
+                    recorder.end(status)
+                if vis is not None:
                     vis.draw_world()
-                    plt.show(block=True)
+                    vis.show()
                 return status
             
-            if visualize:
+            if vis is not None:
                 vis.draw_world()
             
             # Optional: print state for debugging
-            print(f"Step {steps}: Pos={self.agent_pos}, Dir={self.agent_dir}, Action={action}")
-            print("Percepts:", self.percepts)
+            if verbose:
+                print(f"Step {steps}: Pos={self.agent_pos}, Dir={self.agent_dir}, Action={action_name(action)}")
+                print("Percepts:", self.percepts)
         
-        print("Max steps reached")
-        if visualize:
+        if verbose:
+            if status == "stuck":
+                print("Agent is stuck")
+            elif steps < max_steps:
+                print("Time budget used up")
+            else:
+                print("Max steps reached")
+        if recorder is not None:
+            recorder.end(status)
+        if vis is not None:
             vis.draw_world()
-            plt.show(block=True)
-        return "continue"
+            vis.show()
+        return status
 
 class WumpusVisualizer:
-    def __init__(self, world):
+    # matplotlib is imported here rather than at module level, so headless
+    # runs never pay for it. The artists are created once; draw_world only
+    # moves the agent and repaints cells whose contents changed.
+    #
+    # pause: seconds to wait after each frame in interactive mode; 0 just
+    # flushes the frame without waiting.
+    # frame_dir: render offscreen and save every frame there as a PNG
+    # instead of opening a window.
+    DIR_SYMBOLS = {"up": 'v', "down": '^', "left": '<', "right": '>'}
+
+    def __init__(self, world, pause=0.5, frame_dir=None):
+        from matplotlib import patches
+        
         self.world = world
-        self.fig, self.ax = plt.subplots(figsize=(8, 8))
         self.grid_size = world.grid_size
+        self.pause = pause
+        self.frame_dir = frame_dir
+        self.frame_index = 0
+        if frame_dir is not None:
+            # Offscreen: a bare Figure renders through Agg without pyplot
+            from matplotlib.figure import Figure
+            os.makedirs(frame_dir, exist_ok=True)
+            self.plt = None
+            self.fig = Figure(figsize=(8, 8))
+            self.ax = self.fig.subplots()
+        else:
+            import matplotlib.pyplot as plt
+            self.plt = plt
+            self.fig, self.ax = plt.subplots(figsize=(8, 8))
         self.ax.set_xlim(-0.5, self.grid_size - 0.5)
         self.ax.set_ylim(-0.5, self.grid_size - 0.5)
         self.ax.set_xticks(range(self.grid_size))
         self.ax.set_yticks(range(self.grid_size))
         self.ax.grid(True)
         self.ax.set_aspect('equal')
-        self.ax.invert_yaxis()  # To match grid coordinates
         
-    def draw_world(self):
-        self.ax.clear()
-        self.ax.set_xlim(-0.5, self.grid_size - 0.5)
-        self.ax.set_ylim(-0.5, self.grid_size - 0.5)
-        self.ax.set_xticks(range(self.grid_size))
-        self.ax.set_yticks(range(self.grid_size))
-        self.ax.grid(True)
-        
-        # Draw cells
+        self.cells = [[None] * self.grid_size for _ in range(self.grid_size)]
+        self.labels = [[None] * self.grid_size for _ in range(self.grid_size)]
+        self.cell_state = [[None] * self.grid_size for _ in range(self.grid_size)]
         for i in range(self.grid_size):
             for j in range(self.grid_size):
-                cell = self.world.world[i][j]
-                color = 'white'
-                if cell["pit"]:
-                    color = 'black'
-                elif cell["wumpus"] and self.world.wumpus_alive:
-                    color = 'red'
-                elif cell["gold"]:
-                    color = 'gold'
-                
                 rect = patches.Rectangle((j-0.5, i-0.5), 1, 1, 
                                         linewidth=1, edgecolor='gray', 
-                                        facecolor=color, alpha=0.5)
+                                        facecolor='white', alpha=0.5)
                 self.ax.add_patch(rect)
-                
-                # Add text for important cells
-                if cell["pit"]:
-                    self.ax.text(j, i, "Pit", ha='center', va='center')
-                if cell["wumpus"] and self.world.wumpus_alive:
-                    self.ax.text(j, i, "Wumpus", ha='center', va='center')
-                if cell["gold"]:
-                    self.ax.text(j, i, "Gold", ha='center', va='center')
+                self.cells[i][j] = rect
+        self.world_state = None
+        
+        self.agent_marker, = self.ax.plot([], [], 'bo', markersize=15)
+        self.agent_symbol = self.ax.text(0, 0, '', ha='center', va='center', color='white')
+        
+    def cell_appearance(self, cell):
+        color = 'white'
+        if cell["pit"]:
+            color = 'black'
+        elif cell["wumpus"] and self.world.wumpus_alive:
+            color = 'red'
+        elif cell["gold"]:
+            color = 'gold'
+        
+        labels = []
+        if cell["pit"]:
+            labels.append("Pit")
+        if cell["wumpus"] and self.world.wumpus_alive:
+            labels.append("Wumpus")
+        if cell["gold"]:
+            labels.append("Gold")
+        return color, "\n".join(labels)
+    
+    def update_cells(self):
+        # Cell contents only change when the gold is picked up or the
+        # Wumpus dies, so the grid is only rescanned after one of those
+        state = (self.world.has_gold, self.world.wumpus_alive)
+        if state == self.world_state:
+            return
+        self.world_state = state
+        for i in range(self.grid_size):
+            for j in range(self.grid_size):
+                appearance = self.cell_appearance(self.world.world[i][j])
+                if appearance == self.cell_state[i][j]:
+                    continue
+                self.cell_state[i][j] = appearance
+                color, label = appearance
+                self.cells[i][j].set_facecolor(color)
+                if self.labels[i][j] is None:
+                    if not label:
+                        continue
+                    self.labels[i][j] = self.ax.text(j, i, "", ha='center', va='center')
+                self.labels[i][j].set_text(label)
+    
+    def draw_world(self):
+        self.update_cells()
         
         # Draw agent
         x, y = self.world.agent_pos
-        dir_symbol = 'v'
-        if self.world.agent_dir == "down":
-            dir_symbol = '^'
-        elif self.world.agent_dir == "left":
-            dir_symbol = '<'
-        elif self.world.agent_dir == "right":
-            dir_symbol = '>'
-        
-        self.ax.plot(y, x, 'bo', markersize=15)
-        self.ax.text(y, x, dir_symbol, ha='center', va='center', color='white')
+        self.agent_marker.set_data([y], [x])
+        self.agent_symbol.set_position((y, x))
+        self.agent_symbol.set_text(self.DIR_SYMBOLS[self.world.agent_dir])
         
         # Add title with status
         status = ""
@@ -533,10 +1215,23 @@ class WumpusVisualizer:
         title = f"Wumpus World - Agent at ({x}, {y}) {status}"
         self.ax.set_title(title)
         
-        plt.pause(0.5)
+        if self.frame_dir is not None:
+            self.fig.savefig(os.path.join(self.frame_dir, f"frame_{self.frame_index:06d}.png"))
+            self.frame_index += 1
+        elif self.pause > 0:
+            self.plt.pause(self.pause)
+        else:
+            self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
+    
+    def show(self):
+        # Keeps the final frame on screen until the window is closed
+        if self.plt is not None:
+            self.plt.show(block=True)
     
     def close(self):
-        plt.close()
+        if self.plt is not None:
+            self.plt.close(self.fig)
 
 if __name__ == "__main__":
     env = WumpusWorld()
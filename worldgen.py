@@ -0,0 +1,121 @@
+import numpy as np
+
+from wampusworld import BREEZE_BIT, GLITTER_BIT, STENCH_BIT, WumpusWorld
+
+# Every cell of a batch is one byte; the low bits are the layout and the
+# high bits the percepts that can be felt from that cell
+PIT = 1
+WUMPUS = 2
+GOLD = 4
+STENCH = 8
+BREEZE = 16
+
+
+def _adjacent_any(plane):
+    # True where at least one orthogonal neighbour is set in plane
+    out = np.zeros_like(plane)
+    out[:, 1:, :] |= plane[:, :-1, :]
+    out[:, :-1, :] |= plane[:, 1:, :]
+    out[:, :, 1:] |= plane[:, :, :-1]
+    out[:, :, :-1] |= plane[:, :, 1:]
+    return out
+
+
+class WorldBatch:
+    def __init__(self, cells):
+        # cells: uint8 array of shape (count, grid_size, grid_size)
+        self.cells = cells
+
+    @classmethod
+    def from_layout(cls, layout):
+        # Adds the stench and breeze bits to a layout holding only
+        # PIT/WUMPUS/GOLD bits
+        layout = np.asarray(layout, dtype=np.uint8) & (PIT | WUMPUS | GOLD)
+        stench = _adjacent_any((layout & WUMPUS) != 0)
+        breeze = _adjacent_any((layout & PIT) != 0)
+        cells = layout | (stench * np.uint8(STENCH)) | (breeze * np.uint8(BREEZE))
+        return cls(cells)
+
+    def __len__(self):
+        return self.cells.shape[0]
+
+    @property
+    def grid_size(self):
+        return self.cells.shape[1]
+
+    @property
+    def pits(self):
+        return (self.cells & PIT) != 0
+
+    @property
+    def wumpus(self):
+        return (self.cells & WUMPUS) != 0
+
+    @property
+    def gold(self):
+        return (self.cells & GOLD) != 0
+
+    @property
+    def stench(self):
+        return (self.cells & STENCH) != 0
+
+    @property
+    def breeze(self):
+        return (self.cells & BREEZE) != 0
+
+    def percepts(self, index, x, y, wumpus_alive=True):
+        # Percept bits, as WumpusWorld.sense() gives them; percept_dict
+        # turns them into the old dict
+        cell = int(self.cells[index, x, y])
+        bits = 0
+        if cell & STENCH and wumpus_alive:
+            bits |= STENCH_BIT
+        if cell & BREEZE:
+            bits |= BREEZE_BIT
+        if cell & GOLD:
+            bits |= GLITTER_BIT
+        return bits
+
+    def to_grid(self, index):
+        # Same list-of-lists-of-dicts layout that WumpusWorld.generate_world builds
+        return [[{"pit": bool(cell & PIT), "wumpus": bool(cell & WUMPUS), "gold": bool(cell & GOLD)}
+                 for cell in row]
+                for row in self.cells[index].tolist()]
+
+    def to_world(self, index):
+        return WumpusWorld(world=self.to_grid(index))
+
+
+def generate_worlds(count, grid_size=4, pit_prob=0.2, rng=None):
+    # Same distribution as WumpusWorld.generate_world: the Wumpus and the gold
+    # on distinct cells other than the start, then pits on the remaining
+    # cells with probability pit_prob. Drawn without rejection sampling.
+    if not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng)
+    n_cells = grid_size * grid_size
+    if n_cells < 3:
+        raise ValueError("grid_size must be at least 2")
+
+    wumpus = rng.integers(1, n_cells, size=count)
+    # Index into the n_cells - 2 cells left over and skip past the Wumpus
+    gold = rng.integers(1, n_cells - 1, size=count)
+    gold += gold >= wumpus
+
+    layout = np.zeros((count, n_cells), dtype=np.uint8)
+    rows = np.arange(count)
+    layout[rows, wumpus] = WUMPUS
+    layout[rows, gold] = GOLD
+
+    pits = rng.random((count, n_cells)) < pit_prob
+    pits[:, 0] = False
+    pits &= layout == 0
+    layout[pits] = PIT
+
+    return WorldBatch.from_layout(layout.reshape(count, grid_size, grid_size))
+
+
+def iter_world_batches(total, batch_size=65536, grid_size=4, pit_prob=0.2, rng=None):
+    if not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng)
+    for start in range(0, total, batch_size):
+        yield generate_worlds(min(batch_size, total - start), grid_size, pit_prob, rng)